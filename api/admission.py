@@ -0,0 +1,143 @@
+import asyncio
+import json
+import math
+import time
+from typing import Dict, Any, List, Optional
+from src.utils.metrics import metrics
+
+
+class AdmissionQueue:
+    """
+    Bounded admission for one route class: at most `concurrency` requests run,
+    at most `queue_depth` wait, everything else is rejected straight away.
+    """
+
+    def __init__(self, name: str, paths: List[str], concurrency: int = 8, queue_depth: int = 16,
+                 max_wait_seconds: float = 30, retry_after_seconds: int = 2):
+        self.name = name
+        self.paths = paths
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def matches(self, path: str) -> bool:
+        return any(path == p or path.startswith(p.rstrip('/') + '/') for p in self.paths)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely free, from the recent median service time.
+        """
+        p50 = metrics.percentile(f"route:{self.name}", 50)
+        if p50 is None:
+            return self.retry_after_seconds
+        return max(1, math.ceil(p50 * (self.waiting + 1) / self.concurrency))
+
+    async def acquire(self, disconnected: 'asyncio.Future') -> str:
+        """
+        Wait for a slot. Returns 'admitted', 'full', 'timeout' or 'disconnected'.
+        """
+        if self.semaphore.locked() and self.waiting >= self.queue_depth:
+            return 'full'
+        self.waiting += 1
+        acquire = asyncio.ensure_future(self.semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire, disconnected}, timeout=self.max_wait_seconds,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.waiting -= 1
+        if acquire in done:
+            return 'admitted'
+        acquire.cancel()
+        try:
+            await acquire
+            # Acquired in the same tick it was cancelled; give the slot back
+            self.semaphore.release()
+        except asyncio.CancelledError:
+            pass
+        return 'disconnected' if disconnected in done else 'timeout'
+
+    def release(self):
+        self.semaphore.release()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying per-route-class admission queues from the
+    `admission` section of params.yaml. Overload answers 429 with Retry-After,
+    and queued requests whose client has gone away are dropped before they
+    reach a worker thread.
+    """
+
+    def __init__(self, app, config: Dict[str, Any] = None):
+        self.app = app
+        self.queues = [AdmissionQueue(name, **options) for name, options in (config or {}).items()]
+
+    def classify(self, path: str) -> Optional[AdmissionQueue]:
+        for queue in self.queues:
+            if queue.matches(path):
+                return queue
+        return None
+
+    async def __call__(self, scope, receive, send):
+        queue = self.classify(scope.get('path', '')) if scope['type'] == 'http' else None
+        if queue is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the body first, so the next receive() only completes on disconnect
+        body_messages = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                metrics.increment(f"admission:{queue.name}:disconnected")
+                return
+            body_messages.append(message)
+            if not message.get('more_body', False):
+                break
+
+        disconnected = asyncio.ensure_future(receive())
+        outcome = await queue.acquire(disconnected)
+        metrics.increment(f"admission:{queue.name}:{outcome}")
+        if outcome == 'disconnected':
+            return
+        if outcome != 'admitted':
+            disconnected.cancel()
+            await self._reject(send, queue)
+            return
+
+        async def replay():
+            if body_messages:
+                return body_messages.pop(0)
+            return await disconnected
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            queue.release()
+            disconnected.cancel()
+            metrics.record_latency(f"route:{queue.name}", time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, queue: AdmissionQueue):
+        body = json.dumps({'detail': f"Too many concurrent {queue.name} requests, retry later"}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 429,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('ascii')),
+                (b'retry-after', str(queue.retry_after()).encode('ascii')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -1,23 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from models.schemas import UploadResponse, AskRequest, AskResponse, ChallengeResponse, EvaluateRequest, EvaluateResponse, SummaryResponse
-from src.components.document_service import save_and_parse_document, get_summary, get_document_text
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from models.schemas import UploadResponse, AskRequest, AskResponse, ChallengeResponse, EvaluateRequest, EvaluateResponse, SummaryResponse, MetricsResponse, AppendResponse, ConversationRequest, ConversationResponse, UsageResponse, SessionUsageResponse
+from src.components.document_service import save_and_parse_document, append_to_document, get_summary, get_section_titles, get_document_text
 from src.components.question_answering import answer_question
-from src.components.question_generation import generate_logic_challenges_dict, evaluate_challenge_answers
+from src.components.question_generation import generate_logic_challenges_dict, generate_logic_challenges, evaluate_challenge_answers
+from src.components.context_cache import context_cache
+from src.components.speculation import speculative_challenges
+from src.pipeline.interaction_pipeline import conversation_manager
 from src.components.evaluation import evaluate_answer
 from src.utils.session_store import session_store
+from src.utils.metrics import metrics
+from src.utils.llm_utils import task_deadline
+from src.utils.parser_pool import DocumentParseError
+from src.utils.usage import bind_usage, in_current_context, usage_tracker
 
 router = APIRouter()
 
 # Batch challenge question/answer workflow
-from models.schemas import ChallengeDictResponse, ChallengeAnswersRequest, ChallengeBatchFeedbackResponse
+from models.schemas import ChallengeDictResponse, ChallengeAnswersRequest, ChallengeBatchFeedbackResponse, BulkGradeRequest
+from src.components.bulk_grading import grade_bulk_ndjson
 
 @router.get('/challenge-dict/{session_id}', response_model=ChallengeDictResponse)
 def get_challenge_dict(session_id: str):
+    bind_usage(session_id, '/challenge-dict')
     if not session_store.session_exists(session_id):
         raise HTTPException(status_code=404, detail='Session not found')
-    doc_text = get_document_text(session_id)
-    questions = generate_logic_challenges_dict(doc_text)
-    session_store.update_session(session_id, {'challenges_dict': questions})
+    deadline = task_deadline('challenge_generation')
+    # Served from the set pre-generated after upload when there is one
+    questions = speculative_challenges.get(session_id, deadline)
+    if questions is None:
+        doc_text = get_document_text(session_id)
+        questions = session_store.get_or_create(session_id, 'challenges_dict', lambda: generate_logic_challenges_dict(
+            doc_text, cached_content=context_cache.get(session_id), deadline=deadline), deadline)
     return ChallengeDictResponse(session_id=session_id, questions=questions)
 
 @router.post('/challenge/submit', response_model=ChallengeBatchFeedbackResponse)
@@ -26,6 +41,7 @@ def submit_challenge_answers(request: ChallengeAnswersRequest):
     Submit challenge answers and automatically evaluate them.
     Returns detailed feedback with scores for each answer and overall assessment.
     """
+    bind_usage(request.session_id, '/challenge/submit')
     if not session_store.session_exists(request.session_id):
         raise HTTPException(status_code=404, detail='Session not found')
     
@@ -34,67 +50,180 @@ def submit_challenge_answers(request: ChallengeAnswersRequest):
     
     # Get document text and questions for evaluation
     doc_text = get_document_text(request.session_id)
-    questions = session_store.get_session(request.session_id).get('challenges_dict', {})
+    questions = session_store.get_field(request.session_id, 'challenges_dict') or {}
+    
+    cached_content = context_cache.get(request.session_id)
+    deadline = task_deadline('challenge_evaluation')
     
-    # If no questions found in session, generate them (fallback)
+    # If no questions found in session, use the pre-generated set or generate them (fallback)
+    if not questions:
+        questions = speculative_challenges.get(request.session_id, deadline) or {}
     if not questions:
-        questions = generate_logic_challenges_dict(doc_text)
-        session_store.update_session(request.session_id, {'challenges_dict': questions})
+        questions = session_store.get_or_create(request.session_id, 'challenges_dict', lambda: generate_logic_challenges_dict(
+            doc_text, cached_content=cached_content, deadline=deadline), deadline)
     
     # Automatically evaluate the answers
-    feedback = evaluate_challenge_answers(doc_text, questions, request.answers)
+    feedback = evaluate_challenge_answers(doc_text, questions, request.answers, cached_content=cached_content, deadline=deadline,
+                                          index=session_store.get_session(request.session_id).get('index'))
     
     return ChallengeBatchFeedbackResponse(session_id=request.session_id, feedback=feedback)
 
 @router.post('/challenge/evaluate_batch', response_model=ChallengeBatchFeedbackResponse)
 def evaluate_challenge_batch(request: ChallengeAnswersRequest):
+    bind_usage(request.session_id, '/challenge/evaluate_batch')
     if not session_store.session_exists(request.session_id):
         raise HTTPException(status_code=404, detail='Session not found')
     doc_text = get_document_text(request.session_id)
-    questions = session_store.get_session(request.session_id).get('challenges_dict', {})
-    answers = session_store.get_session(request.session_id).get('challenge_answers', {})
+    questions = session_store.get_field(request.session_id, 'challenges_dict') or {}
+    answers = session_store.get_field(request.session_id, 'challenge_answers') or {}
     # If answers are provided in request, use them (for stateless clients)
     if request.answers:
         answers = request.answers
-    feedback = evaluate_challenge_answers(doc_text, questions, answers)
+    feedback = evaluate_challenge_answers(doc_text, questions, answers, cached_content=context_cache.get(request.session_id), deadline=task_deadline('challenge_evaluation'),
+                                          index=session_store.get_session(request.session_id).get('index'))
     return ChallengeBatchFeedbackResponse(session_id=request.session_id, feedback=feedback)
 
+@router.post('/challenge/bulk_grade')
+def bulk_grade_challenge(request: BulkGradeRequest):
+    """
+    Grade many students' answers to the session's challenge set.
+    Streams one NDJSON line per student as soon as it is graded, then a
+    summary line with throughput (students graded per minute).
+    """
+    bind_usage(request.session_id, '/challenge/bulk_grade')
+    if not session_store.session_exists(request.session_id):
+        raise HTTPException(status_code=404, detail='Session not found')
+    questions = session_store.get_field(request.session_id, 'challenges_dict') or {}
+    if not questions:
+        raise HTTPException(status_code=400, detail='No challenge questions for this session; fetch /challenge-dict first')
+    doc_text = get_document_text(request.session_id)
+    return StreamingResponse(
+        in_current_context(grade_bulk_ndjson(doc_text, questions, request.submissions, cached_content=context_cache.get(request.session_id),
+                                             index=session_store.get_session(request.session_id).get('index'))),
+        media_type='application/x-ndjson'
+    )
+
 @router.post('/upload', response_model=UploadResponse)
 def upload_document(file: UploadFile = File(...)):
+    bind_usage(None, '/upload')
     if not (file.filename.endswith('.pdf') or file.filename.endswith('.txt')):
         raise HTTPException(status_code=400, detail='Only PDF and TXT files are supported.')
     file_bytes = file.file.read()
-    session_id, summary = save_and_parse_document(file_bytes, file.filename)
-    return UploadResponse(session_id=session_id, summary=summary)
+    try:
+        session_id, summary = save_and_parse_document(file_bytes, file.filename, deadline=task_deadline('summary'))
+    except DocumentParseError as e:
+        raise HTTPException(status_code=422, detail=f'Could not parse document: {e}')
+    normalization = session_store.get_session(session_id).get('normalization')
+    return UploadResponse(session_id=session_id, summary=summary, normalization=normalization)
+
+@router.post('/upload/{session_id}/append', response_model=AppendResponse)
+def append_document(session_id: str, file: Optional[UploadFile] = File(None), text: Optional[str] = Form(None)):
+    """
+    Add a new section (PDF/TXT file or raw text) to an existing session.
+    """
+    bind_usage(session_id, '/upload/append')
+    if not session_store.session_exists(session_id):
+        raise HTTPException(status_code=404, detail='Session not found')
+    if file is not None and not (file.filename.endswith('.pdf') or file.filename.endswith('.txt')):
+        raise HTTPException(status_code=400, detail='Only PDF and TXT files are supported.')
+    try:
+        result = append_to_document(
+            session_id,
+            file=file.file.read() if file is not None else None,
+            filename=file.filename if file is not None else None,
+            text=text,
+            deadline=task_deadline('summary')
+        )
+    except DocumentParseError as e:
+        raise HTTPException(status_code=422, detail=f'Could not parse document: {e}')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AppendResponse(session_id=session_id, **result)
 
 @router.get('/summary/{session_id}', response_model=SummaryResponse)
-def get_document_summary(session_id: str):
+def get_document_summary(session_id: str, max_words: Optional[int] = Query(None, ge=10, le=5000), section: Optional[str] = None):
+    """
+    The document summary, optionally of at most `max_words` words and/or for
+    one section (1-based number or title prefix). Answered from the summary
+    tree built at upload; an LLM call is only made to shorten a summary.
+    """
+    bind_usage(session_id, '/summary')
     if not session_store.session_exists(session_id):
         raise HTTPException(status_code=404, detail='Session not found')
-    summary = get_summary(session_id)
-    return SummaryResponse(session_id=session_id, summary=summary)
+    try:
+        summary = get_summary(session_id, max_words, section, deadline=task_deadline('summary'))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Section not found; sections: {', '.join(get_section_titles(session_id))}")
+    return SummaryResponse(session_id=session_id, summary=summary, section=section, sections=get_section_titles(session_id))
 
 @router.post('/ask', response_model=AskResponse)
 def ask_anything(request: AskRequest):
+    bind_usage(request.session_id, '/ask')
     if not session_store.session_exists(request.session_id):
         raise HTTPException(status_code=404, detail='Session not found')
     doc_text = get_document_text(request.session_id)
-    result = answer_question(request.question, doc_text)
+    session = session_store.get_session(request.session_id)
+    result = answer_question(request.question, doc_text, doc_hash=session.get('doc_hash'), deadline=task_deadline('ask'), index=session.get('index'))
     return AskResponse(**result)
 
+@router.post('/conversation', response_model=ConversationResponse)
+def ask_in_conversation(request: ConversationRequest):
+    """
+    Ask a question that may refer back to earlier turns of the session's conversation.
+    """
+    bind_usage(request.session_id, '/conversation')
+    if not session_store.session_exists(request.session_id):
+        raise HTTPException(status_code=404, detail='Session not found')
+    result = conversation_manager.ask(request.session_id, request.question, deadline=task_deadline('ask'))
+    return ConversationResponse(session_id=request.session_id, **result)
+
+@router.delete('/conversation/{session_id}')
+def reset_conversation(session_id: str):
+    if not session_store.session_exists(session_id):
+        raise HTTPException(status_code=404, detail='Session not found')
+    conversation_manager.reset(session_id)
+    return {'session_id': session_id, 'reset': True}
+
 @router.get('/challenge/{session_id}', response_model=ChallengeResponse)
 def get_challenge(session_id: str):
+    bind_usage(session_id, '/challenge')
     if not session_store.session_exists(session_id):
         raise HTTPException(status_code=404, detail='Session not found')
     doc_text = get_document_text(session_id)
-    questions = generate_logic_challenges(doc_text)
+    questions = generate_logic_challenges(doc_text, cached_content=context_cache.get(session_id), deadline=task_deadline('challenge_generation'))
     session_store.update_session(session_id, {'challenges': questions})
     return ChallengeResponse(session_id=session_id, questions=questions)
 
 @router.post('/evaluate', response_model=EvaluateResponse)
 def evaluate_user_answer(request: EvaluateRequest):
+    bind_usage(request.session_id, '/evaluate')
     if not session_store.session_exists(request.session_id):
         raise HTTPException(status_code=404, detail='Session not found')
     doc_text = get_document_text(request.session_id)
-    result = evaluate_answer(request.question, request.user_answer, doc_text)
+    result = evaluate_answer(request.question, request.user_answer, doc_text, cached_content=context_cache.get(request.session_id), deadline=task_deadline('evaluation'),
+                             index=session_store.get_session(request.session_id).get('index'))
     return EvaluateResponse(**result)
+
+@router.get('/metrics', response_model=MetricsResponse)
+def get_metrics():
+    """
+    Counters (including model routing decisions) and rolling latency stats.
+    """
+    return MetricsResponse(**metrics.snapshot())
+
+@router.get('/usage', response_model=UsageResponse)
+def get_usage():
+    """
+    Token usage and cost per route and model, the global budget window and
+    the mode it currently allows.
+    """
+    return UsageResponse(**usage_tracker.snapshot())
+
+@router.get('/usage/{session_id}', response_model=SessionUsageResponse)
+def get_session_usage(session_id: str):
+    """
+    A session's token usage and cost, its budget and the mode it currently allows.
+    """
+    if not session_store.session_exists(session_id):
+        raise HTTPException(status_code=404, detail='Session not found')
+    return SessionUsageResponse(session_id=session_id, **usage_tracker.session_usage(session_id))
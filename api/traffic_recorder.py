@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+from urllib.parse import parse_qsl
+from pydantic import BaseModel
+from models import schemas
+from src.utils.metrics import metrics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+# Dict keys kept verbatim: API field names and challenge question ids (q1);
+# anything else, such as student ids, is replaced by its length
+_SCHEMA_FIELDS = frozenset(
+    name for model in vars(schemas).values()
+    if isinstance(model, type) and issubclass(model, BaseModel) for name in model.model_fields
+)
+_QUESTION_KEY_RE = re.compile(r'q\d{1,4}')
+_FILENAME_RE = re.compile(rb'filename="[^"\r\n]*?(\.[A-Za-z0-9]{1,8})"')
+
+
+class SessionAliases:
+    """
+    Stable pseudonyms for session ids: the same session gets the same alias
+    in every worker process (the salt is shared through a file next to the
+    recording), but the id itself cannot be recovered from a recording.
+    """
+
+    def __init__(self, salt_path: str):
+        self.salt = self._load_salt(salt_path)
+
+    @staticmethod
+    def _load_salt(path: str) -> bytes:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(path, 'rb') as f:
+                return f.read()
+        salt = os.urandom(16)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(salt)
+        return salt
+
+    def alias(self, session_id: str) -> str:
+        return 's-' + hashlib.sha256(self.salt + session_id.encode('utf-8')).hexdigest()[:12]
+
+
+def _is_safe_key(key: str) -> bool:
+    return key in _SCHEMA_FIELDS or bool(_QUESTION_KEY_RE.fullmatch(key))
+
+
+def shape(value: Any, aliases: SessionAliases, max_items: int = 50) -> Any:
+    """
+    The shape of a JSON value with its content removed: strings become their
+    length, containers keep their structure (at most `max_items` items, plus
+    the full count), numbers and booleans are kept and session ids become
+    aliases. Dict keys are kept only if they are API field names or question
+    ids; other keys (student ids, free-form answer keys) become their length.
+    """
+    if isinstance(value, str):
+        if _UUID_RE.fullmatch(value):
+            return {'session': aliases.alias(value)}
+        return {'str': len(value)}
+    if isinstance(value, list):
+        return {'list': [shape(v, aliases, max_items) for v in value[:max_items]], 'count': len(value)}
+    if isinstance(value, dict):
+        items = list(value.items())
+        return {'dict': [[k if _is_safe_key(k) else {'str': len(k)}, shape(v, aliases, max_items)]
+                         for k, v in items[:max_items]], 'count': len(items)}
+    return value
+
+
+class TrafficRecorderMiddleware:
+    """
+    ASGI middleware writing one sanitized JSONL record per HTTP request:
+    route template, method, request and response sizes, the shape of JSON
+    bodies and query parameters (never their text), aliased session ids,
+    status, duration and the gap since the previous request. Uploads record
+    the alias of the session they create, so a replay can chain later
+    requests onto it. benchmarks/replay_load.py replays a recording.
+
+    Records are written by a background thread; when it falls behind, records
+    are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, app, config: Dict[str, Any] = None):
+        config = config or {}
+        self.app = app
+        path = config.get('path', 'data/traffic/traffic.jsonl')
+        self.path = path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+        self.sample_rate = config.get('sample_rate', 1.0)
+        self.max_body_bytes = config.get('max_body_bytes', 1048576)
+        self.aliases = SessionAliases(f"{self.path}.salt")
+        self._records: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=config.get('max_pending', 10000))
+        self._last_arrival: Optional[float] = None
+        self._writer = threading.Thread(target=self._write_records, name='traffic-recorder', daemon=True)
+        self._writer.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        arrival = time.time()
+        start = time.perf_counter()
+        gap = None if self._last_arrival is None else round(arrival - self._last_arrival, 6)
+        self._last_arrival = arrival
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        # JSON bodies are kept for their shape; for uploads only the part naming the file
+        keep_bytes = {'application/json': self.max_body_bytes, 'multipart/form-data': 4096}.get(content_type, 0)
+        request = {'bytes': 0, 'body': bytearray(), 'content_type': content_type}
+        response = {'status': None, 'bytes': 0, 'body': bytearray()}
+        capture_response = scope.get('path') == '/upload'
+
+        async def recording_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                chunk = message.get('body', b'')
+                request['bytes'] += len(chunk)
+                if len(request['body']) < keep_bytes:
+                    request['body'] += chunk[:keep_bytes - len(request['body'])]
+            return message
+
+        async def recording_send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                chunk = message.get('body', b'')
+                response['bytes'] += len(chunk)
+                if capture_response and len(response['body']) < 65536:
+                    response['body'] += chunk
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            self._enqueue(self._record(scope, arrival, gap, time.perf_counter() - start, request, response))
+
+    def _record(self, scope, arrival: float, gap: Optional[float], duration: float,
+                request: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        path = scope.get('path', '')
+        route = getattr(scope.get('route'), 'path', None) or _UUID_RE.sub('{session_id}', path)
+        content_type = request['content_type']
+        record = {
+            'ts': round(arrival, 6),
+            'gap': gap,
+            'method': scope.get('method'),
+            'route': route,
+            'request_bytes': request['bytes'],
+            'content_type': content_type or None,
+            'status': response['status'],
+            'response_bytes': response['bytes'],
+            'duration': round(duration, 6),
+            'pid': os.getpid(),
+        }
+        session = _UUID_RE.search(path)
+        if session:
+            record['session'] = self.aliases.alias(session.group(0))
+        query = scope.get('query_string', b'').decode('latin-1')
+        if query:
+            record['query'] = {k: (int(v) if v.isdigit() else {'str': len(v)}) for k, v in parse_qsl(query)}
+        if content_type == 'application/json' and request['body']:
+            try:
+                body = json.loads(bytes(request['body']))
+                record['body'] = shape(body, self.aliases)
+                if isinstance(body, dict) and isinstance(body.get('session_id'), str):
+                    record['session'] = self.aliases.alias(body['session_id'])
+            except ValueError:
+                record['body'] = None
+        elif content_type == 'multipart/form-data':
+            extension = _FILENAME_RE.search(bytes(request['body']))
+            record['file_ext'] = extension.group(1).decode('ascii').lower() if extension else None
+        if response['body']:
+            try:
+                created = json.loads(bytes(response['body'])).get('session_id')
+                if created:
+                    record['creates'] = self.aliases.alias(created)
+            except (ValueError, AttributeError):
+                pass
+        return record
+
+    def _enqueue(self, record: Dict[str, Any]):
+        try:
+            self._records.put_nowait(record)
+        except queue.Full:
+            metrics.increment('traffic_recorder:dropped')
+
+    def _write_records(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        while True:
+            record = self._records.get()
+            # One write per line on an O_APPEND file, so worker processes can share it
+            os.write(fd, (json.dumps(record) + '\n').encode('utf-8'))
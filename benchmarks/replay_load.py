@@ -0,0 +1,378 @@
+"""
+Replay a recorded traffic mix (see `traffic_recorder` in params.yaml) against
+a local instance and report throughput and latency percentiles per route.
+
+    python benchmarks/replay_load.py data/traffic/traffic.jsonl --speeds 1,5,10
+
+By default the app is started with `uvicorn main:app` and all model calls go
+to a stub OpenAI-compatible server run by this script, which answers after
+--stub-latency seconds (with jitter) and returns schema-valid JSON for
+structured calls; no API key is needed and nothing is billed. Artifacts and
+uploads go to a temporary directory. Pass --url to drive an instance you
+started yourself instead.
+
+Recordings hold request shapes, not content: strings are replayed as filler
+text of the recorded length, uploads as generated documents of the recorded
+size (or --document), and sessions are re-created and chained the way they
+were used. Sessions that were created before the recording started are
+uploaded once before each run.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import httpx  # noqa: E402
+import yaml  # noqa: E402
+from config.settings import PARAMS  # noqa: E402
+
+_WORDS = ('model', 'attention', 'results', 'method', 'dataset', 'training', 'evaluation', 'baseline', 'layer',
+          'accuracy', 'proposed', 'approach', 'experiments', 'performance', 'network', 'analysis', 'the', 'of',
+          'and', 'we', 'show', 'that', 'improves', 'over', 'prior', 'work', 'on', 'benchmark', 'tasks')
+
+
+def filler(length: int, rng: random.Random) -> str:
+    words, size = [], 0
+    while size < length:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def document(size: int, rng: random.Random) -> str:
+    sentences, total = [], 0
+    while total < size:
+        sentence = filler(rng.randint(60, 160), rng).capitalize() + '.'
+        sentences.append(sentence)
+        total += len(sentence) + 1
+    return ' '.join(sentences)
+
+
+# ---------------------------------------------------------------------------
+# Stub model server
+
+def schema_example(schema: Dict[str, Any], definitions: Dict[str, Any], rng: random.Random) -> Any:
+    if '$ref' in schema:
+        return schema_example(definitions[schema['$ref'].split('/')[-1]], definitions, rng)
+    if 'anyOf' in schema:
+        return schema_example(schema['anyOf'][0], definitions, rng)
+    kind = schema.get('type')
+    if kind == 'object':
+        return {name: schema_example(s, definitions, rng) for name, s in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [schema_example(schema.get('items', {}), definitions, rng) for _ in range(3)]
+    if kind == 'number':
+        return round(rng.random(), 2)
+    if kind == 'integer':
+        return rng.randint(1, 5)
+    if kind == 'boolean':
+        return True
+    return filler(rng.randint(20, 120), rng)
+
+
+class StubModelServer:
+    """
+    Minimal OpenAI-compatible /chat/completions endpoint with a fixed latency.
+    """
+
+    def __init__(self, latency: float, jitter: float = 0.5, seed: int = 0):
+        stub = self
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))) or b'{}')
+                payload = json.dumps(stub.complete(body)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            rng = random.Random(self._rng.random())
+        time.sleep(max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter))))
+        response_format = body.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            schema = response_format['json_schema']['schema']
+            content = json.dumps(schema_example(schema, schema.get('$defs', {}), rng))
+        else:
+            content = filler(rng.randint(300, 900), rng)
+        prompt_chars = sum(len(m.get('content') or '') for m in body.get('messages', []))
+        usage = {'prompt_tokens': prompt_chars // 4, 'completion_tokens': len(content) // 4}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        return {
+            'id': f"stub-{self.calls}", 'object': 'chat.completion', 'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage,
+        }
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+def start_app(workdir: str, stub_url: str, port: int, workers: int) -> subprocess.Popen:
+    """
+    Start `uvicorn main:app` with every model call routed to the stub.
+    """
+    params = copy.deepcopy(PARAMS)
+    providers = params.setdefault('providers', {})
+    providers['order'] = ['openai']
+    providers.setdefault('openai', {}).update({'enabled': True, 'base_url': stub_url})
+    params.setdefault('artifact_store', {})['root'] = os.path.join(workdir, 'artifacts')
+    params.setdefault('shared_index', {})['root'] = os.path.join(workdir, 'shared')
+    params.setdefault('traffic_recorder', {})['enabled'] = False
+    params_path = os.path.join(workdir, 'params.yaml')
+    with open(params_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(params, f)
+
+    env = {**os.environ, 'PARAMS_PATH': params_path, 'UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+           'GOOGLE_API_KEY': '', 'OPENAI_API_KEY': 'stub', 'OPENAI_BASE_URL': stub_url}
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    process.terminate()
+    process.wait()
+    with open(log.name, 'r', encoding='utf-8', errors='replace') as f:
+        raise RuntimeError(f"Server did not start:\n{f.read()[-2000:]}")
+
+
+# ---------------------------------------------------------------------------
+# Replay
+
+class Replay:
+    """
+    One timed run of a recording at `speed`x its original pace.
+    """
+
+    def __init__(self, client: httpx.Client, records: List[Dict[str, Any]], speed: float, concurrency: int,
+                 document_path: Optional[str] = None, seed: int = 0):
+        self.client = client
+        self.records = records
+        self.speed = speed
+        self.rng = random.Random(seed)
+        self.document_path = document_path
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay')
+        self.sessions: Dict[str, Future] = {}
+        self.results: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def session(self, alias: str) -> str:
+        return self.sessions[alias].result()
+
+    def seed_sessions(self):
+        # Sessions used but not created within the recording
+        created = {r['creates'] for r in self.records if r.get('creates')}
+        for alias in {r['session'] for r in self.records if r.get('session')} - created:
+            future = Future()
+            try:
+                future.set_result(self._upload(4000, None))
+            except Exception as e:
+                future.set_exception(e)
+            self.sessions[alias] = future
+        for alias in created:
+            self.sessions[alias] = Future()
+
+    def _upload_file(self, size: int, extension: Optional[str]):
+        if self.document_path and (extension is None or self.document_path.endswith(extension)):
+            with open(self.document_path, 'rb') as f:
+                return os.path.basename(self.document_path), f.read()
+        with self._lock:
+            text = document(max(size, 200), random.Random(self.rng.random()))
+        return f"replay-{abs(hash(text)) % 10 ** 8}.txt", text.encode('utf-8')
+
+    def _upload(self, size: int, extension: Optional[str]) -> str:
+        name, content = self._upload_file(size, extension)
+        response = self.client.post('/upload', files={'file': (name, content)})
+        response.raise_for_status()
+        return response.json()['session_id']
+
+    def synthesize(self, shape: Any, rng: random.Random) -> Any:
+        if isinstance(shape, dict):
+            if 'session' in shape:
+                return self.session(shape['session'])
+            if 'str' in shape:
+                return filler(shape['str'], rng)
+            if 'list' in shape:
+                items = [self.synthesize(s, rng) for s in shape['list']]
+                while items and len(items) < shape.get('count', len(items)):
+                    items.append(items[len(items) % len(shape['list'])])
+                return items
+            if 'dict' in shape:
+                result = {}
+                for i, (key, value) in enumerate(shape['dict']):
+                    result[key if isinstance(key, str) else f"k{i}"] = self.synthesize(value, rng)
+                for i in range(len(result), shape.get('count', len(result))):
+                    result[f"k{i}"] = self.synthesize(shape['dict'][i % len(shape['dict'])][1], rng)
+                return result
+        return shape
+
+    def send(self, record: Dict[str, Any]) -> httpx.Response:
+        with self._lock:
+            rng = random.Random(self.rng.random())
+        path = record['route']
+        if '{session_id}' in path:
+            path = path.replace('{session_id}', self.session(record['session']))
+        params = {k: (v if isinstance(v, int) else filler(v['str'], rng)) for k, v in record.get('query', {}).items()}
+        method = record['method']
+        if record['route'] == '/upload':
+            name, content = self._upload_file(record['request_bytes'], record.get('file_ext'))
+            return self.client.post(path, files={'file': (name, content)})
+        if record.get('content_type') in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+            if record.get('file_ext'):
+                name, content = self._upload_file(record['request_bytes'], record['file_ext'])
+                return self.client.request(method, path, params=params, files={'file': (name, content)})
+            return self.client.request(method, path, params=params,
+                                       data={'text': document(record['request_bytes'], rng)})
+        if record.get('body') is not None:
+            return self.client.request(method, path, params=params, json=self.synthesize(record['body'], rng))
+        return self.client.request(method, path, params=params)
+
+    def _run_one(self, record: Dict[str, Any], scheduled: float):
+        start = time.perf_counter()
+        result = {'route': f"{record['method']} {record['route']}", 'lag': start - scheduled}
+        try:
+            response = self.send(record)
+            result['status'] = response.status_code
+            if record.get('creates'):
+                response.raise_for_status()
+                self.sessions[record['creates']].set_result(response.json()['session_id'])
+        except Exception as e:
+            result['status'] = None
+            result['error'] = f"{type(e).__name__}: {e}"
+            if record.get('creates') and not self.sessions[record['creates']].done():
+                self.sessions[record['creates']].set_exception(e)
+        result['latency'] = time.perf_counter() - start
+        with self._lock:
+            self.results.append(result)
+
+    def run(self) -> float:
+        self.seed_sessions()
+        t0 = self.records[0]['ts']
+        start = time.perf_counter()
+        for record in self.records:
+            scheduled = start + (record['ts'] - t0) / self.speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.executor.submit(self._run_one, record, scheduled)
+        self.executor.shutdown(wait=True)
+        return time.perf_counter() - start
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def report(results: List[Dict[str, Any]], elapsed: float, speed: float, recorded: float):
+    print(f"\n{speed:g}x: {len(results)} requests in {elapsed:.1f}s (recorded span {recorded:.1f}s), "
+          f"{len(results) / elapsed:.1f} req/s")
+    print(f"{'route':<40} {'count':>6} {'errors':>6} {'req/s':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    by_route: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_route.setdefault(result['route'], []).append(result)
+    for route, rows in sorted(by_route.items()) + [('all', results)]:
+        latencies = [r['latency'] for r in rows]
+        errors = sum(1 for r in rows if r['status'] is None or r['status'] >= 400)
+        print(f"{route:<40} {len(rows):>6} {errors:>6} {len(rows) / elapsed:>7.2f} "
+              + ' '.join(f"{percentile(latencies, p) * 1000:>6.0f}ms" for p in (50, 90, 99, 100)))
+    lag = percentile([r['lag'] for r in results], 99)
+    if lag > 0.1:
+        print(f"Dispatch p99 lag {lag * 1000:.0f}ms: raise --concurrency, the client is falling behind")
+    failures = [r['error'] for r in results if r.get('error')]
+    if failures:
+        print(f"{len(failures)} requests failed, e.g. {failures[0]}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Replay recorded traffic against a local instance.')
+    parser.add_argument('recording', help='JSONL written by the traffic recorder')
+    parser.add_argument('--speeds', default='1,5,10', help='Comma-separated replay speed multipliers')
+    parser.add_argument('--url', default=None, help='Drive this running instance instead of starting one')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--stub-latency', type=float, default=0.5, help='Seconds per stubbed model call')
+    parser.add_argument('--concurrency', type=int, default=256, help='Maximum requests in flight')
+    parser.add_argument('--document', default=None, help='Sample file to upload instead of generated text')
+    parser.add_argument('--limit', type=int, default=None, help='Replay only the first N records')
+    args = parser.parse_args(argv)
+
+    with open(args.recording, 'r', encoding='utf-8') as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r['ts'])
+    records = [r for r in records if r.get('route') and not re.match(r'/(metrics|docs|openapi)', r['route'])]
+    records = records[:args.limit] if args.limit else records
+    if not records:
+        parser.error('No replayable records in the recording')
+    recorded = records[-1]['ts'] - records[0]['ts']
+
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    stub, server = None, None
+    try:
+        if args.url:
+            url = args.url
+        else:
+            stub = StubModelServer(args.stub_latency)
+            server = start_app(workdir, stub.url, args.port, args.workers)
+            url = f"http://127.0.0.1:{args.port}"
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        with httpx.Client(base_url=url, timeout=300, limits=limits) as client:
+            for run, speed in enumerate(float(s) for s in args.speeds.split(',')):
+                # A new seed per run, so its uploads are new documents rather than artifact store hits
+                replay = Replay(client, records, speed, args.concurrency, args.document, seed=run)
+                elapsed = replay.run()
+                report(replay.results, elapsed, speed, recorded)
+        if stub is not None:
+            print(f"\n{stub.calls} stubbed model calls")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Memory per worker process with private versus shared document indexes.
+
+Every worker loads the same documents, either rebuilding a private
+DocumentIndex from the stored arrays (one copy per process) or attaching to
+the shared registry (one copy in total), reads it, and reports the
+growth of its RSS and PSS. PSS splits shared pages between the processes
+mapping them, so with sharing it falls as workers are added.
+
+    python benchmarks/shared_memory_rss.py --workers 1,2,4,8 --documents 20
+
+Linux only (reads /proc/self/smaps_rollup).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np  # noqa: E402
+from src.utils.chunk_utils import DocumentIndex  # noqa: E402
+from src.utils.shared_index import SharedIndexRegistry  # noqa: E402
+
+
+def memory_kb() -> dict:
+    usage = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                usage[name.lower()] = int(value.split()[0])
+    return usage
+
+
+def make_documents(count: int, sentences: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10)))
+                  for _ in range(20000)]
+    documents = []
+    for _ in range(count):
+        documents.append(' '.join(
+            ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(8, 25))).capitalize() + '.'
+            for _ in range(sentences)
+        ))
+    return documents
+
+
+def _touch(index) -> int:
+    # Read every sentence and run a few searches, as requests would
+    total = sum(len(s) for s in index.sentences)
+    for query in ('method results', 'evaluation data', 'model'):
+        total += len(index.search(query))
+    return total
+
+
+def _worker(mode: str, workdir: str, doc_hashes: list, barrier, results):
+    before = memory_kb()
+    registry = SharedIndexRegistry(os.path.join(workdir, 'shared'))
+    indexes = []
+    for doc_hash in doc_hashes:
+        if mode == 'shared':
+            index = registry.attach(doc_hash)
+        else:
+            with open(os.path.join(workdir, f"{doc_hash}.txt"), 'r', encoding='utf-8') as f:
+                text = f.read()
+            arrays = dict(np.load(os.path.join(workdir, f"{doc_hash}.npz")))
+            index = DocumentIndex.from_arrays(text, arrays)
+            del text, arrays
+        _touch(index)
+        indexes.append(index)
+    # Measure while every worker holds its indexes, so shared pages count once
+    barrier.wait()
+    after = memory_kb()
+    results.put({k: after[k] - before[k] for k in after})
+    barrier.wait()
+
+
+def run(workers: int, mode: str, workdir: str, doc_hashes: list) -> list:
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, workdir, doc_hashes, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts')
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--sentences', type=int, default=4000, help='Sentences per document')
+    args = parser.parse_args(argv)
+
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    workdir = tempfile.mkdtemp(prefix='shared-index-bench-', dir=base)
+    try:
+        registry = SharedIndexRegistry(os.path.join(workdir, 'shared'), max_documents=args.documents)
+        doc_hashes = []
+        for i, text in enumerate(make_documents(args.documents, args.sentences)):
+            doc_hash = f"doc{i:04d}"
+            index = DocumentIndex()
+            index.add_text(text)
+            arrays = index.to_arrays()
+            with open(os.path.join(workdir, f"{doc_hash}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+            np.savez(os.path.join(workdir, f"{doc_hash}.npz"), **arrays)
+            registry.publish(doc_hash, text, arrays)
+            doc_hashes.append(doc_hash)
+        size_mb = sum(os.path.getsize(os.path.join(registry.path(h), name)) for h in doc_hashes
+                      for name in os.listdir(registry.path(h))) / 2 ** 20
+        print(f"{args.documents} documents x {args.sentences} sentences, {size_mb:.1f} MB shared\n")
+        print(f"{'workers':>7}  {'mode':<7}  {'RSS/worker':>11}  {'PSS/worker':>11}  {'PSS total':>10}")
+        for workers in (int(w) for w in args.workers.split(',')):
+            for mode in ('private', 'shared'):
+                measured = run(workers, mode, workdir, doc_hashes)
+                rss = sum(m['rss'] for m in measured) / len(measured) / 1024
+                pss = sum(m['pss'] for m in measured) / len(measured) / 1024
+                print(f"{workers:>7}  {mode:<7}  {rss:>8.1f} MB  {pss:>8.1f} MB  {pss * workers:>7.1f} MB", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,17 @@
-
 import os
+import yaml
 from dotenv import load_dotenv
 load_dotenv()
 GEMINI_API_KEY=os.getenv("GOOGLE_API_KEY", "")
+OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL=os.getenv("OPENAI_BASE_URL", "")
+
+PARAMS_PATH = os.getenv("PARAMS_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "params.yaml"))
+
+def load_params(path: str = PARAMS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+PARAMS = load_params()
@@ -2,10 +2,67 @@ import streamlit as st
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
+from requests.adapters import HTTPAdapter
 
 # Configuration
 API_BASE_URL = "http://localhost:8000"
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 60)
+UPLOAD_TIMEOUT = (5, 180)
+CHALLENGE_TIMEOUT = (5, 120)
+BULK_GRADE_TIMEOUT = (5, 300)
+CACHE_TTL_SECONDS = 3600
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Keep-alive connection pool shared by every rerun and user of this app"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Background workers for requests that can run while the user reads"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+def api_get(path: str, timeout=DEFAULT_TIMEOUT) -> requests.Response:
+    return get_http_session().get(f"{API_BASE_URL}{path}", timeout=timeout)
+
+def api_post(path: str, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return get_http_session().post(f"{API_BASE_URL}{path}", timeout=timeout, **kwargs)
+
+def _get_json(path: str, timeout=DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    response = api_get(path, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_summary(session_id: str) -> str:
+    return _get_json(f"/summary/{session_id}")["summary"]
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_challenge_questions(session_id: str) -> Dict[str, str]:
+    return _get_json(f"/challenge-dict/{session_id}", timeout=CHALLENGE_TIMEOUT)["questions"]
+
+def prefetch_challenge_questions(session_id: str):
+    """Start generating the challenge set while the user reads the summary"""
+    st.session_state.questions_future = get_executor().submit(
+        _get_json, f"/challenge-dict/{session_id}", CHALLENGE_TIMEOUT
+    )
+
+def load_challenge_questions(session_id: str) -> Dict[str, str]:
+    future = st.session_state.get("questions_future")
+    if future is not None:
+        st.session_state.questions_future = None
+        try:
+            return future.result(timeout=CHALLENGE_TIMEOUT[1])["questions"]
+        except Exception:
+            pass  # fall through to a regular fetch
+    return fetch_challenge_questions(session_id)
 
 def main():
     st.set_page_config(
@@ -138,6 +195,13 @@ def main():
         st.session_state.questions = None
     if 'interaction_mode' not in st.session_state:
         st.session_state.interaction_mode = None
+    if 'questions_future' not in st.session_state:
+        st.session_state.questions_future = None
+    if st.session_state.document_uploaded and st.session_state.summary is None:
+        try:
+            st.session_state.summary = fetch_summary(st.session_state.session_id)
+        except Exception:
+            pass
     
     # Sidebar for navigation
     with st.sidebar:
@@ -192,13 +256,14 @@ def upload_section():
                 try:
                     # Upload file
                     files = {"file": (uploaded_file.name, uploaded_file.getvalue())}
-                    response = requests.post(f"{API_BASE_URL}/upload", files=files)
+                    response = api_post("/upload", files=files, timeout=UPLOAD_TIMEOUT)
                     
                     if response.status_code == 200:
                         result = response.json()
                         st.session_state.session_id = result["session_id"]
                         st.session_state.summary = result["summary"]
                         st.session_state.document_uploaded = True
+                        prefetch_challenge_questions(result["session_id"])
                         
                         st.success("✅ Document uploaded and analyzed successfully!")
                         st.rerun()
@@ -246,7 +311,7 @@ def ask_anything_mode():
         if question.strip():
             with st.spinner("Analyzing your question..."):
                 try:
-                    response = requests.post(f"{API_BASE_URL}/ask", json={
+                    response = api_post("/ask", json={
                         "session_id": st.session_state.session_id,
                         "question": question
                     })
@@ -283,15 +348,10 @@ def challenge_mode():
     if st.session_state.questions is None:
         with st.spinner("Generating challenge questions..."):
             try:
-                response = requests.get(f"{API_BASE_URL}/challenge-dict/{st.session_state.session_id}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    st.session_state.questions = result["questions"]
-                else:
-                    st.error(f"❌ Error generating questions: {response.text}")
-                    return
-                    
+                st.session_state.questions = load_challenge_questions(st.session_state.session_id)
+            except requests.HTTPError as e:
+                st.error(f"❌ Error generating questions: {e.response.text}")
+                return
             except Exception as e:
                 st.error(f"❌ Error: {str(e)}")
                 return
@@ -325,10 +385,10 @@ def challenge_mode():
             else:
                 with st.spinner("Evaluating your answers..."):
                     try:
-                        response = requests.post(f"{API_BASE_URL}/challenge/submit", json={
+                        response = api_post("/challenge/submit", json={
                             "session_id": st.session_state.session_id,
                             "answers": answers
-                        })
+                        }, timeout=CHALLENGE_TIMEOUT)
                         
                         if response.status_code == 200:
                             result = response.json()
@@ -339,12 +399,56 @@ def challenge_mode():
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
     
+    bulk_grade_section()
+    
     # Back button
     if st.button("⬅️ Back to Mode Selection"):
         st.session_state.interaction_mode = None
         st.session_state.questions = None
         st.rerun()
 
+def bulk_grade_section():
+    """Grade a whole class's answers, showing each student as soon as they are graded"""
+    with st.expander("👥 Bulk grade many students"):
+        st.markdown('Upload a JSON file mapping student ids to their answers, e.g. `{"alice": {"q1": "...", "q2": "..."}}`.')
+        submissions_file = st.file_uploader("Submissions file", type=['json'], key="bulk_submissions")
+        if submissions_file is None or not st.button("📊 Grade All", type="primary"):
+            return
+        try:
+            submissions = json.loads(submissions_file.getvalue())
+        except ValueError as e:
+            st.error(f"❌ Invalid JSON: {str(e)}")
+            return
+
+        progress = st.progress(0.0)
+        rows = []
+        table = st.empty()
+        try:
+            with api_post("/challenge/bulk_grade", json={
+                "session_id": st.session_state.session_id,
+                "submissions": submissions
+            }, stream=True, timeout=BULK_GRADE_TIMEOUT) as response:
+                if response.status_code != 200:
+                    st.error(f"❌ Error grading submissions: {response.text}")
+                    return
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if 'summary' in record:
+                        summary = record['summary']
+                        st.success(f"✅ Graded {summary['students']} students in {summary['seconds']}s")
+                        continue
+                    overall = record['feedback'].get('overall', {})
+                    rows.append({
+                        "Student": record['student_id'],
+                        "Overall score": overall.get('score') if isinstance(overall, dict) else None,
+                    })
+                    table.dataframe(rows, use_container_width=True)
+                    progress.progress(min(1.0, len(rows) / max(1, len(submissions))))
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+
 def display_evaluation_results(feedback: Dict[str, Any]):
     """Display evaluation results in a structured format"""
     st.markdown("### 🎯 Evaluation Results")
@@ -426,6 +530,7 @@ def reset_session():
     st.session_state.document_uploaded = False
     st.session_state.summary = None
     st.session_state.questions = None
+    st.session_state.questions_future = None
     st.session_state.interaction_mode = None
     st.rerun()
 
@@ -1,9 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
+from api.admission import AdmissionMiddleware
+from api.traffic_recorder import TrafficRecorderMiddleware
+from config.settings import PARAMS
+from src.utils.llm_utils import DeadlineExceeded
 
 app = FastAPI(title="GenAI Document Assistant")
 
+app.add_middleware(AdmissionMiddleware, config=PARAMS.get('admission'))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -12,4 +19,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so requests rejected by admission are recorded too
+if PARAMS.get('traffic_recorder', {}).get('enabled'):
+    app.add_middleware(TrafficRecorderMiddleware, config=PARAMS.get('traffic_recorder'))
+
 app.include_router(router)
+
+@app.exception_handler(DeadlineExceeded)
+def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={'detail': str(exc)})
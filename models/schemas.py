@@ -1,9 +1,17 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, field_validator
+from typing import Dict, List, Optional
 
 class UploadResponse(BaseModel):
     session_id: str
     summary: str
+    normalization: Optional[dict] = None
+
+class AppendResponse(BaseModel):
+    session_id: str
+    summary: str
+    appended_sentences: int
+    total_sentences: int
+    normalization: Optional[dict] = None
 
 class AskRequest(BaseModel):
     session_id: str
@@ -13,6 +21,16 @@ class AskResponse(BaseModel):
     answer: str
     reference_snippet: str
 
+class ConversationRequest(BaseModel):
+    session_id: str
+    question: str
+
+class ConversationResponse(BaseModel):
+    session_id: str
+    answer: str
+    reference_snippet: str
+    turn: int
+
 class ChallengeDictResponse(BaseModel):
     session_id: str
     questions: dict
@@ -25,6 +43,11 @@ class ChallengeBatchFeedbackResponse(BaseModel):
     session_id: str
     feedback: dict
 
+class BulkGradeRequest(BaseModel):
+    session_id: str
+    # student_id -> {question_id: answer}
+    submissions: Dict[str, Dict[str, str]]
+
 class ChallengeResponse(BaseModel):
     session_id: str
     questions: List[str]
@@ -42,3 +65,66 @@ class EvaluateResponse(BaseModel):
 class SummaryResponse(BaseModel):
     session_id: str
     summary: str
+    section: Optional[str] = None
+    sections: Optional[List[str]] = None
+
+class MetricsResponse(BaseModel):
+    counters: dict
+    latencies: dict
+
+class UsageResponse(BaseModel):
+    total: dict
+    window: dict
+    routes: dict
+    models: dict
+    sessions: int
+    mode: str
+
+class SessionUsageResponse(BaseModel):
+    session_id: str
+    usage: dict
+    budget_usd: Optional[float] = None
+    mode: str
+
+# Structured LLM outputs, passed to Gemini as response schemas
+
+class ScoredFeedback(BaseModel):
+    score: float
+    feedback: str
+
+    @field_validator('score')
+    @classmethod
+    def score_in_range(cls, value: float) -> float:
+        if not 0.0 <= value <= 1.0:
+            raise ValueError('score must be between 0 and 1')
+        return value
+
+class QuestionFeedback(ScoredFeedback):
+    question_id: str
+
+class ChallengeEvaluation(BaseModel):
+    evaluations: List[QuestionFeedback]
+    overall: ScoredFeedback
+
+class StudentEvaluation(BaseModel):
+    student_id: str
+    evaluations: List[QuestionFeedback]
+    overall: ScoredFeedback
+
+class BulkChallengeEvaluation(BaseModel):
+    students: List[StudentEvaluation]
+
+class ChallengeQuestions(BaseModel):
+    questions: List[str]
+
+class AnswerEvaluation(BaseModel):
+    score: float
+    justification: str
+    reference_snippet: str
+
+    @field_validator('score')
+    @classmethod
+    def score_in_range(cls, value: float) -> float:
+        if not 0.0 <= value <= 1.0:
+            raise ValueError('score must be between 0 and 1')
+        return value
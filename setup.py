@@ -22,6 +22,11 @@ setuptools.setup(
     project_urls = {
         "Bug Tracker": f"https://github.com/{AUTHOR_USER_NAME}/{REPO_NAME}/issues"
 },
+    entry_points = {
+        "console_scripts": [
+            "research-ingest = src.pipeline.bulk_ingest:main",
+        ]
+},
 
 
 )
\ No newline at end of file
@@ -0,0 +1,160 @@
+import contextvars
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Tuple, Type
+from pydantic import BaseModel
+from config.settings import PARAMS
+from src.utils.llm_utils import StructuredOutputError, DeadlineExceeded, remaining_seconds, extract_json, validate_structured, repair_schema, repair_prompt
+from src.utils.metrics import metrics
+from src.utils.usage import usage_tracker
+
+HEDGING = PARAMS.get('hedging', {})
+
+# Calls run here so the caller can stop waiting at its deadline
+_executor = ThreadPoolExecutor(max_workers=HEDGING.get('max_workers', 64), thread_name_prefix='llm')
+
+
+class LLMProvider(ABC):
+    """
+    Common interface for LLM backends. Subclasses implement a single blocking
+    model call in `_call`; deadlines, hedging, latency tracking and
+    schema-validated output are shared here.
+    """
+    provider = 'llm'
+    id = ''
+
+    @property
+    def metrics_key(self) -> str:
+        return f"{self.provider}:{self.id}"
+
+    @abstractmethod
+    def _call(self, prompt, generation_config, timeout: Optional[float]):
+        """
+        Make one blocking model call and return the raw response.
+        """
+
+    @abstractmethod
+    def _wrap(self, raw_response):
+        """
+        Wrap a raw response in an object exposing `.text`.
+        """
+
+    @abstractmethod
+    def _json_config(self, schema: Type[BaseModel]) -> Dict[str, Any]:
+        """
+        Per-call generation config that constrains output to `schema`.
+        """
+
+    def _usage(self, raw_response) -> Optional[Tuple[int, int, int]]:
+        """
+        (prompt, output, cached prompt) token counts from a raw response's
+        metadata, or None if the provider does not report them.
+        """
+        return None
+
+    def generate(self, prompt, generation_config=None, deadline: Optional[float] = None):
+        """
+        Generate content from the model
+
+        If the call is still running at the model's recent p95 latency and
+        hedging is enabled, an identical second call is fired and whichever
+        answers first is used.
+
+        Args:
+            prompt: The prompt string or object to send to the model
+            generation_config: Optional per-call overrides of the model's generation config
+            deadline: Optional absolute time.monotonic() deadline for the call
+
+        Returns:
+            A response wrapper exposing `.text`
+
+        Raises:
+            DeadlineExceeded: If no response arrives before the deadline
+        """
+        remaining = remaining_seconds(deadline)
+        # Each call runs in a copy of the caller's context, so its usage is billed to the caller's session
+        calls = [_executor.submit(contextvars.copy_context().run, self._timed_call, prompt, generation_config, remaining)]
+
+        hedge_after = self._hedge_after()
+        if hedge_after is not None and (remaining is None or hedge_after < remaining):
+            done, _ = wait(calls, timeout=hedge_after)
+            if not done:
+                metrics.increment(f"hedging:{self.id}:fired")
+                calls.append(_executor.submit(contextvars.copy_context().run, self._timed_call, prompt, generation_config,
+                                              remaining_seconds(deadline)))
+
+        pending = set(calls)
+        while True:
+            done, pending = wait(pending, timeout=remaining_seconds(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                metrics.increment(f"deadline:{self.id}:exceeded")
+                raise DeadlineExceeded(f"{self.provider} {self.id} did not respond before the deadline")
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is None and pending:
+                # One of the hedged calls failed; keep waiting for the other
+                continue
+            winner = winner or next(iter(done))
+            if len(calls) > 1 and winner is calls[1]:
+                metrics.increment(f"hedging:{self.id}:won")
+            return self._wrap(winner.result())
+
+    def _timed_call(self, prompt, generation_config, timeout: Optional[float]):
+        start = time.perf_counter()
+        try:
+            response = self._call(prompt, generation_config, timeout)
+        except Exception:
+            metrics.record_latency(self.metrics_key, time.perf_counter() - start, ok=False)
+            raise
+        metrics.record_latency(self.metrics_key, time.perf_counter() - start)
+        usage = self._usage(response)
+        if usage is not None:
+            usage_tracker.record(self.id, *usage)
+        return response
+
+    def _hedge_after(self) -> Optional[float]:
+        if not HEDGING.get('enabled'):
+            return None
+        return metrics.percentile(self.metrics_key, HEDGING.get('percentile', 95), HEDGING.get('min_samples', 20))
+
+    def generate_structured(self, prompt, schema: Type[BaseModel], repair: bool = True, deadline: Optional[float] = None) -> BaseModel:
+        """
+        Generate JSON constrained to a pydantic schema and validate it
+
+        The schema is sent in the provider's structured-output mode. If
+        validation fails, one repair call asks only for the invalid fields.
+
+        Args:
+            prompt: The prompt string to send to the model
+            schema: Pydantic model describing the expected response
+            repair: Whether to make the bounded repair call on validation failure
+            deadline: Optional absolute time.monotonic() deadline shared by both calls
+
+        Returns:
+            An instance of `schema`
+
+        Raises:
+            StructuredOutputError: If the response is still invalid after repair
+        """
+        response = self.generate(prompt, generation_config=self._json_config(schema), deadline=deadline)
+        data = extract_json(response.text)
+        result, invalid, messages = validate_structured(data, schema)
+        if result is not None:
+            return result
+        if not repair:
+            raise StructuredOutputError('; '.join(messages), response.text, data if isinstance(data, dict) else None)
+
+        partial = data if isinstance(data, dict) else {}
+        fix_schema = repair_schema(schema, invalid)
+        fix = self.generate(
+            repair_prompt(prompt, response.text, list(fix_schema.model_fields), messages),
+            generation_config=self._json_config(fix_schema),
+            deadline=deadline
+        )
+        fixed = extract_json(fix.text)
+        if isinstance(fixed, dict):
+            partial = {**partial, **{k: v for k, v in fixed.items() if k in fix_schema.model_fields}}
+        result, _, messages = validate_structured(partial, schema)
+        if result is None:
+            raise StructuredOutputError('; '.join(messages), fix.text, partial)
+        return result
@@ -1,32 +1,95 @@
+import time
 import google.generativeai as genai
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, Type
+from pydantic import BaseModel
+from src.Agent.base import LLMProvider
 
 
-class Gemini:
-    def __init__(self, api_key='api_key', id='gemini-1.5-flash-latest', temprature=0.2, **kwargs):
+class Gemini(LLMProvider):
+    provider = 'gemini'
+
+    def __init__(self, api_key='api_key', id='gemini-1.5-flash-latest', temprature=0.2, cached_content=None, cache_api=None, **kwargs):
         self.api_key = api_key
         self.id = id
+        # Anything exposing create(model=..., contents=..., ttl=..., display_name=...);
+        # swappable for a local stub in tests. genai.caching is only looked up
+        # when a cache is created.
+        self.cache_api = cache_api
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(
-            self.id,
-            generation_config=genai.GenerationConfig(
-                temperature=temprature,
-                **kwargs
-            )
+        generation_config = genai.GenerationConfig(
+            temperature=temprature,
+            **kwargs
         )
+        if cached_content is not None:
+            # Cached content is bound to the model it was created for
+            self.id = cached_content.model
+            self.model = genai.GenerativeModel.from_cached_content(cached_content, generation_config=generation_config)
+        else:
+            self.model = genai.GenerativeModel(self.id, generation_config=generation_config)
     
-    def generate(self, prompt):
+    def _call(self, prompt, generation_config, timeout: Optional[float]):
+        request_options = {'timeout': timeout} if timeout else None
+        return self.model.generate_content([prompt], generation_config=generation_config, request_options=request_options)
+
+    def _wrap(self, raw_response):
+        return GeminiResponse(raw_response)
+
+    def _usage(self, raw_response) -> Optional[Tuple[int, int, int]]:
+        metadata = getattr(raw_response, 'usage_metadata', None)
+        if metadata is None:
+            return None
+        return (
+            getattr(metadata, 'prompt_token_count', 0) or 0,
+            getattr(metadata, 'candidates_token_count', 0) or 0,
+            getattr(metadata, 'cached_content_token_count', 0) or 0,
+        )
+
+    def create_cache(self, contents, ttl_seconds: int, display_name: Optional[str] = None) -> 'CachedContext':
         """
-        Generate content using Gemini model
+        Upload contents once as cached context for this model
         
         Args:
-            prompt: The prompt string or object to send to the model
+            contents: The content (e.g. document text) to cache
+            ttl_seconds: How long the cache should live
+            display_name: Optional label for the cached resource
             
         Returns:
-            GeminiResponse: A wrapper object with the model's response
+            CachedContext: Handle to pass as `cached_content` to later Gemini instances
         """
-        response = self.model.generate_content([prompt])
-        return GeminiResponse(response)
+        cache_api = self.cache_api or genai.caching.CachedContent
+        created = cache_api.create(
+            model=self.id,
+            contents=[contents],
+            ttl=ttl_seconds,
+            display_name=display_name
+        )
+        expire_time = getattr(created, 'expire_time', None)
+        expires_at = expire_time.timestamp() if hasattr(expire_time, 'timestamp') else time.time() + ttl_seconds
+        return CachedContext(created.name, getattr(created, 'model', None) or self.id, expires_at)
+
+    def _json_config(self, schema: Type[BaseModel]) -> Dict[str, Any]:
+        return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+
+class CachedContext:
+    """
+    Handle to a cached-content resource, as stored in the session
+    """
+    
+    def __init__(self, name: str, model: str, expires_at: float):
+        self.name = name
+        self.model = model
+        self.expires_at = expires_at
+
+    def is_valid(self, margin_seconds: float = 0) -> bool:
+        return time.time() + margin_seconds < self.expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'model': self.model, 'expires_at': self.expires_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CachedContext':
+        return cls(data['name'], data['model'], data['expires_at'])
 
 
 class GeminiResponse:
@@ -0,0 +1,60 @@
+from typing import Dict, Any
+from config.settings import PARAMS
+from src.utils.llm_utils import estimate_tokens
+from src.utils.metrics import metrics
+from src.utils.usage import usage_tracker
+
+DEFAULT_MODEL = 'gemini-1.5-flash-latest'
+
+
+class ModelRouter:
+    """
+    Picks a Gemini model per call from the task type, the prompt size, the
+    live latency of each model and the session's remaining budget. Rules
+    live under `model_routing` in params.yaml.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.models = config.get('models') or {'fast': DEFAULT_MODEL}
+        self.tasks = config.get('tasks') or {}
+        self.min_samples = config.get('min_latency_samples', 20)
+        self.probe_every = config.get('probe_every', 20)
+        self._demotions = 0
+        metrics.configure(config.get('latency_window', 200))
+
+    def select(self, task: str, prompt: str) -> str:
+        """
+        Return the model id to use for `task` with the given prompt.
+        """
+        rule = self.tasks.get(task, {})
+        tier, reason = rule.get('tier', 'fast'), 'default'
+
+        threshold = rule.get('strong_above_tokens')
+        if threshold is not None and estimate_tokens(prompt) > threshold:
+            tier, reason = 'strong', 'long_prompt'
+
+        budget = rule.get('max_p95_seconds')
+        if tier == 'strong' and budget is not None:
+            p95 = metrics.percentile(f"gemini:{self._model(tier)}", 95, self.min_samples)
+            if p95 is not None and p95 > budget:
+                # Still let an occasional call through so the latency window can recover
+                self._demotions += 1
+                if not self.probe_every or self._demotions % self.probe_every:
+                    tier, reason = 'fast', 'latency'
+                else:
+                    reason = 'latency_probe'
+
+        if tier != 'fast' and usage_tracker.degraded('fast_model'):
+            tier, reason = 'fast', 'budget'
+
+        model = self._model(tier)
+        metrics.increment(f"routing:{task}:{model}:{reason}")
+        return model
+
+    def _model(self, tier: str) -> str:
+        return self.models.get(tier) or self.models.get('fast', DEFAULT_MODEL)
+
+
+# Singleton instance
+model_router = ModelRouter(PARAMS.get('model_routing'))
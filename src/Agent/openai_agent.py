@@ -0,0 +1,74 @@
+from typing import Dict, Any, Optional, Tuple, Type
+from pydantic import BaseModel
+from src.Agent.base import LLMProvider
+
+
+class OpenAIAgent(LLMProvider):
+    """
+    Agent for OpenAI or any OpenAI-compatible chat completions server
+    (vLLM, Ollama, a local stub, ...), selected through `base_url`.
+    """
+    provider = 'openai'
+
+    def __init__(self, api_key='api_key', id='gpt-4o-mini', temprature=0.2, base_url: Optional[str] = None, **kwargs):
+        try:
+            from openai import OpenAI
+        except ImportError:
+            raise ImportError('openai is required for the OpenAI agent')
+        self.api_key = api_key
+        self.id = id
+        self.temperature = temprature
+        self.kwargs = kwargs
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
+
+    def _call(self, prompt, generation_config, timeout: Optional[float]):
+        return self.client.chat.completions.create(
+            model=self.id,
+            messages=[{'role': 'user', 'content': prompt}],
+            temperature=self.temperature,
+            timeout=timeout,
+            **{**self.kwargs, **(generation_config or {})}
+        )
+
+    def _wrap(self, raw_response):
+        return OpenAIResponse(raw_response)
+
+    def _usage(self, raw_response) -> Optional[Tuple[int, int, int]]:
+        usage = getattr(raw_response, 'usage', None)
+        if usage is None:
+            return None
+        details = getattr(usage, 'prompt_tokens_details', None)
+        return (
+            getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0,
+            getattr(details, 'cached_tokens', 0) or 0,
+        )
+
+    def _json_config(self, schema: Type[BaseModel]) -> Dict[str, Any]:
+        return {
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {'name': schema.__name__, 'schema': schema.model_json_schema()}
+            }
+        }
+
+
+class OpenAIResponse:
+    """
+    Wrapper class for chat completion responses, mirroring GeminiResponse
+    """
+
+    def __init__(self, response):
+        self.raw_response = response
+
+    @property
+    def text(self) -> str:
+        try:
+            return self.raw_response.choices[0].message.content or ''
+        except (AttributeError, IndexError) as e:
+            return f"Error extracting text from response: {str(e)}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+        }
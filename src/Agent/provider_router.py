@@ -0,0 +1,119 @@
+from typing import Dict, Any, List, Optional, Type
+from pydantic import BaseModel
+from config.settings import GEMINI_API_KEY, OPENAI_API_KEY, OPENAI_BASE_URL, PARAMS
+from src.Agent.base import LLMProvider
+from src.Agent.gemini_agent import Gemini
+from src.Agent.model_router import model_router
+from src.utils.llm_utils import DeadlineExceeded
+from src.utils.metrics import metrics
+from src.utils.usage import usage_tracker
+
+PROVIDERS = PARAMS.get('providers', {})
+
+
+class ProviderRouter:
+    """
+    Sends each call to the healthiest, fastest provider and fails over to the
+    others on error. Health comes from the rolling latency and error-rate
+    windows every provider records in `metrics`, so it is shared by every
+    router in the process.
+    """
+
+    def __init__(self, providers: List[LLMProvider], max_error_rate: float = 0.5, min_samples: int = 5,
+                 probe_every: int = 20):
+        self.providers = providers
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+
+    def ranked(self) -> List[LLMProvider]:
+        """
+        Providers ordered best first. Providers without enough samples yet are
+        tried early so they get measured; unhealthy ones (error rate over
+        `max_error_rate` across at least `min_samples` calls) are kept as a last
+        resort, except that every `probe_every`-th call tries them first so
+        their error window can recover.
+        """
+        def score(indexed):
+            position, provider = indexed
+            error_rate = metrics.error_rate(provider.metrics_key, self.min_samples)
+            p50 = metrics.percentile(provider.metrics_key, 50, self.min_samples)
+            expected = 0.0 if p50 is None else p50 / max(0.05, 1.0 - error_rate)
+            health = 1
+            if error_rate > self.max_error_rate:
+                health = 0 if self._probe(provider) else 2
+            return (health, expected, position)
+        return [provider for _, provider in sorted(enumerate(self.providers), key=score)]
+
+    def _probe(self, provider: LLMProvider) -> bool:
+        name = f"providers:{provider.metrics_key}:demoted"
+        metrics.increment(name)
+        if not self.probe_every or metrics.count(name) % self.probe_every:
+            return False
+        metrics.increment(f"providers:{provider.metrics_key}:probe")
+        return True
+
+    def generate(self, prompt, generation_config=None, deadline: Optional[float] = None):
+        # generation_config is provider specific, so it is not forwarded
+        return self._with_failover(lambda provider: provider.generate(prompt, deadline=deadline))
+
+    def generate_structured(self, prompt, schema: Type[BaseModel], repair: bool = True, deadline: Optional[float] = None) -> BaseModel:
+        return self._with_failover(lambda provider: provider.generate_structured(prompt, schema, repair=repair, deadline=deadline))
+
+    def _with_failover(self, call):
+        error = None
+        for attempt, provider in enumerate(self.ranked()):
+            metrics.increment(f"providers:{provider.provider}:{'selected' if attempt == 0 else 'failover'}")
+            try:
+                return call(provider)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                metrics.increment(f"providers:{provider.provider}:error")
+                error = e
+        raise error
+
+
+def llm_available() -> bool:
+    """
+    Whether an LLM call may be made: a provider is configured and the current
+    session's budget is not exhausted. Components use their heuristic
+    fallbacks otherwise.
+    """
+    if not (bool(GEMINI_API_KEY) or _openai_enabled()):
+        return False
+    return not usage_tracker.degraded('heuristic')
+
+
+def get_llm(task: str, prompt: str, temprature: float = 0.1, cached_content=None):
+    """
+    Build the LLM for one call. Calls on Gemini cached content stay on Gemini,
+    since the document is not in their prompt.
+    """
+    if cached_content is not None:
+        return Gemini(api_key=GEMINI_API_KEY, temprature=temprature, cached_content=cached_content)
+
+    providers = []
+    for name in PROVIDERS.get('order', ['gemini']):
+        if name == 'gemini' and GEMINI_API_KEY:
+            providers.append(Gemini(api_key=GEMINI_API_KEY, id=model_router.select(task, prompt), temprature=temprature))
+        elif name == 'openai' and _openai_enabled():
+            from src.Agent.openai_agent import OpenAIAgent
+            config = PROVIDERS.get('openai', {})
+            providers.append(OpenAIAgent(
+                api_key=OPENAI_API_KEY or 'not-needed',
+                id=config.get('model', 'gpt-4o-mini'),
+                temprature=temprature,
+                base_url=OPENAI_BASE_URL or config.get('base_url')
+            ))
+    if not providers:
+        raise RuntimeError('No LLM provider is configured')
+    if len(providers) == 1:
+        return providers[0]
+    return ProviderRouter(providers, PROVIDERS.get('max_error_rate', 0.5), PROVIDERS.get('min_samples', 5),
+                          PROVIDERS.get('probe_every', 20))
+
+
+def _openai_enabled() -> bool:
+    config = PROVIDERS.get('openai', {})
+    return bool(config.get('enabled')) and bool(OPENAI_API_KEY or OPENAI_BASE_URL or config.get('base_url'))
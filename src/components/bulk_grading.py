@@ -0,0 +1,163 @@
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List
+from config.settings import PARAMS
+from src.Agent.provider_router import get_llm, llm_available
+from src.components.question_answering import budget_context
+from src.components.question_generation import evaluate_challenge_answers
+from src.utils.llm_utils import StructuredOutputError, estimate_tokens, task_deadline
+from src.utils.heuristic_scoring import scorer_cache
+from src.utils.metrics import metrics
+from models.schemas import BulkChallengeEvaluation
+
+BULK_GRADING = PARAMS.get('bulk_grading', {})
+
+
+def pack_submissions(questions: Dict[str, str], submissions: Dict[str, Dict[str, str]], fixed_tokens: int) -> List[List[str]]:
+    """
+    Group student ids into as few model calls as the context and output
+    budgets allow. `fixed_tokens` is the per-call cost of the document and
+    instructions.
+    """
+    budget = BULK_GRADING.get('context_budget_tokens', 100000) - fixed_tokens
+    output_budget = BULK_GRADING.get('max_output_tokens', 8000)
+    output_per_student = BULK_GRADING.get('output_tokens_per_answer', 120) * (len(questions) + 1)
+    max_students = BULK_GRADING.get('max_students_per_call', 20)
+
+    batches, current, used = [], [], 0
+    for student_id, answers in submissions.items():
+        cost = estimate_tokens(_student_block(student_id, questions, answers))
+        full = current and (
+            used + cost > budget
+            or (len(current) + 1) * output_per_student > output_budget
+            or len(current) >= max_students
+        )
+        if full:
+            batches.append(current)
+            current, used = [], 0
+        current.append(student_id)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _student_block(student_id: str, questions: Dict[str, str], answers: Dict[str, str]) -> str:
+    lines = [f"Student {student_id}:"]
+    for q_key in questions:
+        lines.append(f"Answer to {q_key}: {answers.get(q_key, '')}")
+    return "\n".join(lines)
+
+
+def _grade_batch(document_text: str, questions: Dict[str, str], submissions: Dict[str, Dict[str, str]],
+                 student_ids: List[str], cached_content=None) -> Dict[str, Dict[str, Any]]:
+    document_text, cached_content = budget_context(" ".join(questions.values()), document_text, cached_content)
+    document = "" if cached_content else f"""
+Document:
+{document_text}
+"""
+    question_text = "\n".join(f"{q_key}: {q}" for q_key, q in questions.items())
+    answers_text = "\n\n".join(_student_block(s, questions, submissions[s]) for s in student_ids)
+    prompt = f"""You are an expert evaluator. Grade each student's answers to the questions below based strictly on the provided document.
+{document}
+Questions:
+{question_text}
+
+Student answers:
+{answers_text}
+
+For every student, return their student id, one evaluation per question using its question id (q1, q2, ...) with a score from 0.0 to 1.0 and specific, constructive feedback, and an overall assessment. Grade every student independently and fairly."""
+
+    llm = get_llm('challenge_evaluation', prompt, cached_content=cached_content)
+    result = llm.generate_structured(prompt, BulkChallengeEvaluation, deadline=task_deadline('bulk_grading'))
+
+    graded = {}
+    for student in result.students:
+        if student.student_id not in submissions:
+            continue
+        feedback = {item.question_id: {"score": item.score, "feedback": item.feedback} for item in student.evaluations}
+        if any(q_key not in feedback for q_key in questions):
+            # Left out for _grade_students to regrade on their own rather than scored 0.0
+            metrics.increment('bulk_grading:incomplete')
+            continue
+        feedback['overall'] = student.overall.model_dump()
+        graded[student.student_id] = feedback
+    return graded
+
+
+def _grade_students(document_text: str, questions: Dict[str, str], submissions: Dict[str, Dict[str, str]],
+                    student_ids: List[str], cached_content=None, index=None) -> Dict[str, Dict[str, Any]]:
+    if not llm_available():
+        results = scorer_cache.get(document_text, index).grade(questions, [submissions[s] for s in student_ids])
+        return dict(zip(student_ids, results))
+    graded = {}
+    if len(student_ids) > 1:
+        try:
+            graded = _grade_batch(document_text, questions, submissions, student_ids, cached_content)
+        except StructuredOutputError as e:
+            print(f"Error in bulk grading batch: {e}")
+    # Students the packed call missed or graded incompletely (or single-student batches) are graded one by one
+    for student_id in student_ids:
+        if student_id not in graded:
+            graded[student_id] = evaluate_challenge_answers(
+                document_text, questions, submissions[student_id],
+                cached_content=cached_content, deadline=task_deadline('challenge_evaluation')
+            )
+    return graded
+
+
+def grade_bulk(document_text: str, questions: Dict[str, str], submissions: Dict[str, Dict[str, str]],
+               cached_content=None, index=None) -> Iterator[Dict[str, Any]]:
+    """
+    Grade many students' answers to one challenge set. Submissions are packed
+    into as few model calls as the budgets allow and the calls run
+    concurrently; each student's feedback is yielded as soon as their batch
+    finishes, followed by a final throughput record. Offline grading scores
+    against the document's shared `index` when given.
+    """
+    start = time.perf_counter()
+    fixed_tokens = 500 + sum(estimate_tokens(q) for q in questions.values())
+    if not cached_content:
+        fixed_tokens += estimate_tokens(document_text)
+    # Offline grading is one vectorized pass, so there is nothing to pack
+    batches = pack_submissions(questions, submissions, fixed_tokens) if llm_available() else [list(submissions)]
+
+    graded_count = 0
+    executor = ThreadPoolExecutor(max_workers=BULK_GRADING.get('concurrency', 4))
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, _grade_students, document_text, questions, submissions,
+                            batch, cached_content, index): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Error in bulk grading: {e}")
+                results = {s: {'error': 'Evaluation failed. Please try again.'} for s in futures[future]}
+            for student_id, feedback in results.items():
+                graded_count += 1
+                yield {'student_id': student_id, 'feedback': feedback}
+    finally:
+        # If the client went away mid-stream, drop the batches not started yet instead of grading them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    metrics.increment('bulk_grading:students', graded_count)
+    metrics.record_latency('bulk_grading', elapsed)
+    yield {
+        'summary': {
+            'students': graded_count,
+            'batches': len(batches),
+            'seconds': round(elapsed, 3),
+            'students_per_minute': round(60.0 * graded_count / elapsed, 1) if elapsed else None,
+        }
+    }
+
+
+def grade_bulk_ndjson(*args, **kwargs) -> Iterator[str]:
+    for record in grade_bulk(*args, **kwargs):
+        yield json.dumps(record) + "\n"
@@ -0,0 +1,59 @@
+import threading
+from typing import Dict, Any, Optional
+from config.settings import GEMINI_API_KEY, PARAMS
+from src.Agent.gemini_agent import Gemini, CachedContext
+from src.utils.llm_utils import estimate_tokens
+from src.utils.session_store import session_store
+
+
+class DocumentContextCache:
+    """
+    Keeps one Gemini cached-content handle per session so the document is
+    sent once instead of with every grading or challenge prompt.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, cache_api=None):
+        config = config or {}
+        self.enabled = config.get('enabled', False)
+        self.model = config.get('model', 'models/gemini-1.5-flash-002')
+        self.ttl_seconds = config.get('ttl_seconds', 3600)
+        self.min_tokens = config.get('min_tokens', 32768)
+        self.refresh_margin = config.get('refresh_margin_seconds', 60)
+        self.cache_api = cache_api
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[CachedContext]:
+        """
+        Return a valid handle for the session's document, creating or
+        refreshing it if needed. Returns None when caching does not apply.
+        """
+        if not self.enabled or not GEMINI_API_KEY:
+            return None
+        text = session_store.document_text(session_id)
+        if estimate_tokens(text) < self.min_tokens:
+            return None
+
+        with self._lock(session_id):
+            stored = session_store.get_session(session_id).get('context_cache')
+            if stored:
+                handle = CachedContext.from_dict(stored)
+                if handle.is_valid(self.refresh_margin):
+                    return handle
+            try:
+                gemini = Gemini(api_key=GEMINI_API_KEY, id=self.model, cache_api=self.cache_api)
+                handle = gemini.create_cache(text, self.ttl_seconds, display_name=f"session-{session_id}")
+            except Exception as e:
+                # Caching is an optimisation; callers fall back to sending the document
+                print(f"Error creating context cache: {e}")
+                return None
+            session_store.update_session(session_id, {'context_cache': handle.to_dict()})
+            return handle
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+
+# Singleton instance
+context_cache = DocumentContextCache(PARAMS.get('context_cache'))
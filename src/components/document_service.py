@@ -1,37 +1,168 @@
 import os
-from typing import Tuple
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 from src.utils.session_store import session_store
-from src.components.summarizer import generate_summary
-from src.utils.file_utils import read_txt_file, read_pdf_file
+from src.components.summarizer import update_summary
+from src.components.summary_tree import SummaryTree
+from src.pipeline.document_pipeline import process_document
+from src.components.context_cache import context_cache
+from src.components.speculation import speculative_challenges
+from src.utils.chunk_utils import DocumentIndex
+from src.utils.artifact_store import artifact_store
+from src.utils.shared_index import shared_indexes
+from src.utils.usage import usage_tracker
 
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'uploads')
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'uploads'))
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def save_and_parse_document(file, filename: str) -> Tuple[str, str]:
+# Serializes appends to the same session
+_append_locks: Dict[str, threading.Lock] = {}
+_append_locks_guard = threading.Lock()
+
+def save_and_parse_document(file, filename: str, deadline: float = None) -> Tuple[str, str]:
     """
-    Save uploaded file, parse text, create session, and generate summary.
+    Save uploaded file, parse and normalize text, create session, and build the
+    summary tree (chunk, section and document summaries). A document already in the artifact store (uploaded before, or bulk
+    ingested) reuses its stored summaries and index. Challenge questions are
+    then pre-generated in the background.
     Returns (session_id, summary)
     """
     file_path = os.path.join(UPLOAD_DIR, filename)
     with open(file_path, 'wb') as f:
         f.write(file)
     
-    if filename.lower().endswith('.pdf'):
-        text = read_pdf_file(file_path)
-    elif filename.lower().endswith('.txt'):
-        text = read_txt_file(file_path)
-    else:
-        raise ValueError('Unsupported file type')
+    text, normalization = process_document(file_path, filename)
 
-    summary = generate_summary(text)
-    session_id = session_store.create_session({'filename': filename, 'file_path': file_path, 'text': text, 'summary': summary})
+    doc_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    stored = artifact_store.load_document(doc_hash)
+    if stored is not None and stored['summary'] is not None:
+        summary, index, tree = stored['summary'], stored['index'], stored['summary_tree']
+    else:
+        tree = SummaryTree.build(text, deadline=deadline)
+        summary = tree.summary
+        index = DocumentIndex()
+        index.add_text(text)
+        artifact_store.save_document(doc_hash, text, index, summary, {'filename': filename, 'normalization': normalization})
+        artifact_store.save_summary_tree(doc_hash, tree.to_dict())
+        # Serve from the shared read-only copy, which other workers attach to
+        index = shared_indexes.publish(doc_hash, text, index.to_arrays()) or index
+    session = {'filename': filename, 'file_path': file_path, 'summary': summary, 'doc_hash': doc_hash, 'normalization': normalization, 'index': index, 'summary_tree': tree}
+    if not getattr(index, 'read_only', False):
+        # Otherwise the text is read from the shared index
+        session['text'] = text
+    session_id = session_store.create_session(session)
+    # The summary calls above count against the new session's budget
+    usage_tracker.assign_session(session_id)
+    # Upload the document once as Gemini cached context for later grading calls
+    context_cache.get(session_id)
+    speculative_challenges.schedule(session_id)
     return session_id, summary
 
+def append_to_document(session_id: str, file=None, filename: str = None, text: str = None, deadline: float = None) -> Dict:
+    """
+    Append an uploaded file or raw text to an existing session's document.
+    Only the new part is parsed, normalized, indexed and added to the summary
+    tree; the document summary is re-derived from the section summaries. The
+    new part is stored and published as a tail chained to the current
+    document, so nothing already stored is copied again. The session's
+    challenge set no longer covers the whole document and is dropped, along
+    with answers submitted to it.
+    Returns the updated summary and index counts.
+    """
+    if file is not None:
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        with open(file_path, 'wb') as f:
+            f.write(file)
+        new_text, normalization = process_document(file_path, filename)
+    else:
+        new_text, normalization = (text or '').strip(), {}
+    if not new_text:
+        raise ValueError('Nothing to append')
+
+    with _append_lock(session_id):
+        session = session_store.get_session(session_id)
+        parent_hash = session.get('doc_hash', '')
+        tail = DocumentIndex()
+        added = tail.add_text(new_text)
+        tree = _as_tree(session.get('summary_tree'))
+        if tree is not None:
+            tree.extend(new_text, deadline=deadline)
+            summary = tree.summary
+        else:
+            summary = update_summary(session.get('summary', ''), new_text, deadline=deadline)
+        # Derived from the parent's hash, so the whole text is never rehashed
+        tail_hash = hashlib.sha1(new_text.encode('utf-8')).hexdigest()
+        doc_hash = hashlib.sha1(f"{parent_hash}+{tail_hash}".encode('utf-8')).hexdigest()
+        index = None
+        if parent_hash:
+            artifact_store.save_document(doc_hash, new_text, tail, summary, {'filename': session.get('filename'), 'parent': parent_hash})
+            if tree is not None:
+                artifact_store.save_summary_tree(doc_hash, tree.to_dict())
+            index = shared_indexes.publish(doc_hash, new_text, tail.to_arrays(), parent_hash)
+        update = {}
+        if index is None:
+            # No shared parent to chain to; extend a private copy, which keeps its own text
+            update['text'] = session_store.document_text(session_id) + '\n\n' + new_text
+            index = session.get('index')
+            if index is None:
+                index = DocumentIndex()
+                index.add_text(session.get('text', ''))
+            elif getattr(index, 'read_only', False):
+                index = index.materialize()
+            index.add_text(new_text)
+        speculative_challenges.cancel(session_id)
+        session_store.update_session(session_id, {
+            **update,
+            'summary': summary,
+            'index': index,
+            'summary_tree': tree,
+            'doc_hash': doc_hash,
+            # Empty rather than missing, so workers still holding the old set regenerate it
+            'challenges_dict': {},
+            'challenge_answers': {},
+            # The cached Gemini context no longer matches the document
+            'context_cache': None,
+        })
+    return {'summary': summary, 'appended_sentences': added, 'total_sentences': len(index.sentences), 'normalization': normalization}
+
+def _append_lock(session_id: str) -> threading.Lock:
+    with _append_locks_guard:
+        return _append_locks.setdefault(session_id, threading.Lock())
+
 def get_document_text(session_id: str) -> str:
-    session = session_store.get_session(session_id)
-    return session.get('text', '')
+    return session_store.document_text(session_id)
+
+def get_summary(session_id: str, max_words: Optional[int] = None, section: Union[int, str, None] = None,
+                deadline: float = None) -> str:
+    """
+    The upload summary, or one of another length or for one section answered
+    from the summary tree (see SummaryTree.summarize).
 
-def get_summary(session_id: str) -> str:
+    Raises:
+        KeyError: If `section` does not match a section of the document
+    """
     session = session_store.get_session(session_id)
-    return session.get('summary', '')
+    if max_words is None and section is None:
+        return session.get('summary', '')
+    tree = _as_tree(session.get('summary_tree'))
+    if tree is None:
+        # Sessions from before the tree existed get one on first use
+        tree = SummaryTree.build(get_document_text(session_id), deadline=deadline)
+        tree.dirty = True
+    if tree is not session.get('summary_tree'):
+        session_store.update_session(session_id, {'summary_tree': tree})
+    summary = tree.summarize(max_words, section, deadline=deadline)
+    if tree.dirty:
+        tree.dirty = False
+        artifact_store.save_summary_tree(session.get('doc_hash', ''), tree.to_dict())
+    return summary
+
+def get_section_titles(session_id: str) -> List[str]:
+    tree = _as_tree(session_store.get_session(session_id).get('summary_tree'))
+    return tree.section_titles() if tree is not None else []
+
+def _as_tree(tree) -> Optional[SummaryTree]:
+    # Restored sessions carry the tree in its stored dict form
+    return SummaryTree.from_dict(tree) if isinstance(tree, dict) else tree
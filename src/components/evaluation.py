@@ -1,46 +1,30 @@
 from typing import Dict
-from config.settings import GEMINI_API_KEY
-from src.Agent.gemini_agent import Gemini
-import re
+from src.Agent.provider_router import get_llm, llm_available
+from src.utils.llm_utils import StructuredOutputError
+from src.utils.heuristic_scoring import scorer_cache
+from src.components.question_answering import budget_context
+from models.schemas import AnswerEvaluation
 
-def evaluate_answer(question: str, user_answer: str, document_text: str) -> Dict:
+def evaluate_answer(question: str, user_answer: str, document_text: str, cached_content=None, deadline: float = None, index=None) -> Dict:
     """
-    Evaluate user answer using Gemini agent. Fallback to heuristic if no key.
+    Evaluate user answer using the configured LLM provider. Fallback to heuristic if no key.
+    If `cached_content` is given, the document is referenced from the Gemini cache instead of the prompt.
+    If the document's shared `index` is given, the heuristic fallback scores against it.
     """
-    if not GEMINI_API_KEY:
-        q_words = set(re.findall(r'\w+', question.lower()))
-        a_words = set(re.findall(r'\w+', user_answer.lower()))
-        sentences = re.split(r'(?<=[.!?]) +', document_text)
-        best = ('', 0)
-        for sent in sentences:
-            overlap = len(a_words & set(re.findall(r'\w+', sent.lower())))
-            if overlap > best[1]:
-                best = (sent, overlap)
-        justification = f"Your answer overlaps with: '{best[0]}'" if best[0] else "No clear match found in document."
-        score = min(1.0, best[1]/max(1, len(a_words)))
-        return {
-            'score': score,
-            'justification': justification,
-            'reference_snippet': best[0]
-        }
+    if not llm_available():
+        return scorer_cache.get(document_text, index).evaluate(question, user_answer)
+    document_text, cached_content = budget_context(f"{question} {user_answer}", document_text, cached_content)
+    document = "" if cached_content else f"Document:\n{document_text}\n\n"
     prompt = (
-        f"Evaluate the following user's answer to the given question, strictly using the provided document.\n\nDocument:\n{document_text}\n\nQuestion: {question}\nUser Answer: {user_answer}\n\nGive a score between 0 and 1 (where 1 is perfect), a short justification, and a reference snippet from the document.\nRespond in JSON with keys: score, justification, reference_snippet."
+        f"Evaluate the following user's answer to the given question, strictly using the provided document.\n\n{document}Question: {question}\nUser Answer: {user_answer}\n\nGive a score between 0 and 1 (where 1 is perfect), a short justification, and a reference snippet from the document."
     )
-    gemini = Gemini(api_key=GEMINI_API_KEY, id='gemini-1.5-flash-latest', temprature=0.1)
-    response = gemini.generate(prompt)
-    import json
-    # Try to parse Gemini's JSON response
+    llm = get_llm('evaluation', prompt, cached_content=cached_content)
     try:
-        result = json.loads(response.text)
-        # Ensure all required keys
-        for key in ['score', 'justification', 'reference_snippet']:
-            if key not in result:
-                result[key] = ''
-        return result
-    except Exception:
+        return llm.generate_structured(prompt, AnswerEvaluation, deadline=deadline).model_dump()
+    except StructuredOutputError as e:
         # Fallback: return raw text
         return {
             'score': 0.0,
-            'justification': response.text.strip(),
+            'justification': e.raw_text.strip(),
             'reference_snippet': ''
         }
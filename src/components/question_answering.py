@@ -1,9 +1,14 @@
 from typing import Dict
 import re
-from config.settings import GEMINI_API_KEY
-from src.Agent.gemini_agent import Gemini
+from src.Agent.provider_router import get_llm, llm_available
+from src.utils.answer_cache import answer_cache
+from src.utils.chunk_utils import DocumentIndex
+from src.utils.heuristic_scoring import scorer_cache
+from src.utils.usage import usage_tracker
 
-def extract_relevant_context(question: str, document_text: str, top_k: int = 3) -> str:
+def extract_relevant_context(question: str, document_text: str, top_k: int = 3, index: DocumentIndex = None) -> str:
+    if index is not None:
+        return index.context(question, top_k)
     # Simple heuristic: pick top_k sentences with most keyword overlap
     sentences = re.split(r'(?<=[.!?]) +', document_text)
     q_words = set(re.findall(r'\w+', question.lower()))
@@ -14,33 +19,45 @@ def extract_relevant_context(question: str, document_text: str, top_k: int = 3)
     )
     return " ".join(ranked[:top_k])
 
-def answer_question(question: str, document_text: str) -> Dict:
+def budget_context(query: str, document_text: str, cached_content=None):
     """
-    Uses Gemini agent for context-grounded Q&A. Falls back to keyword matching if no key.
+    The document text and cached context to send with a prompt. Once the
+    session's budget calls for retrieval-only mode, only the sentences most
+    relevant to `query` are sent, without the cached full document.
+    Returns (document_text, cached_content).
     """
-    if not GEMINI_API_KEY:
-        # fallback to keyword matching
-        # fallback to keyword matching
-        sentences = re.split(r'(?<=[.!?]) +', document_text)
-        q_words = set(re.findall(r'\w+', question.lower()))
-        best = ('', 0)
-        for sent in sentences:
-            overlap = len(q_words & set(re.findall(r'\w+', sent.lower())))
-            if overlap > best[1]:
-                best = (sent, overlap)
-        answer = best[0] if best[0] else "Sorry, I couldn't find an answer in the document."
-        return {'answer': answer, 'reference_snippet': answer}
+    if usage_tracker.degraded('retrieval_only'):
+        return extract_relevant_context(query, document_text, top_k=usage_tracker.retrieval_top_k), None
+    return document_text, cached_content
 
-    context = extract_relevant_context(question, document_text)
+def answer_question(question: str, document_text: str, doc_hash: str = None, deadline: float = None, index: DocumentIndex = None) -> Dict:
+    """
+    Uses the configured LLM provider for context-grounded Q&A. Falls back to heuristic term matching if no key.
+    If `doc_hash` is given, answers are shared through the per-document answer cache.
+    If `index` is given, context is retrieved (or, without an LLM, scored) from it instead of rescanning the text.
+    """
+    if not llm_available():
+        # fallback to heuristic term matching
+        return scorer_cache.get(document_text, index).answer(question)
+
+    if doc_hash:
+        cached = answer_cache.get(doc_hash, question)
+        if cached is not None:
+            return cached
+
+    context = extract_relevant_context(question, document_text, index=index)
     prompt = (
         "You are a research document assistant. Answer the question strictly using the provided context. "
         "If the answer is not present in the context, say so.\n\n"
         f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"
     )
-    gemini = Gemini(api_key=GEMINI_API_KEY, id='gemini-1.5-flash-latest', temprature=0.1)
-    response = gemini.generate(prompt)
+    llm = get_llm('ask', prompt)
+    response = llm.generate(prompt, deadline=deadline)
     answer = response.text.strip()
-    return {
+    result = {
         'answer': answer,
         'reference_snippet': context
-    }
\ No newline at end of file
+    }
+    if doc_hash:
+        answer_cache.put(doc_hash, question, result)
+    return result
@@ -0,0 +1,105 @@
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, Optional, Set
+from config.settings import PARAMS
+from src.components.context_cache import context_cache
+from src.components.question_generation import generate_logic_challenges_dict
+from src.utils.llm_utils import DeadlineExceeded, remaining_seconds, task_deadline
+from src.utils.metrics import metrics
+from src.utils.session_store import session_store
+from src.utils.usage import bind_usage
+
+
+class SpeculativeChallenges:
+    """
+    Pre-generates a session's challenge questions in the background right
+    after upload, so /challenge-dict can return them immediately or wait on
+    the job already running. Jobs run on a small dedicated pool so they never
+    take threads from live requests, excess jobs are dropped rather than
+    queued, and jobs for expired sessions are cancelled. Sets are created
+    through `session_store.get_or_create`, so a request handled by another
+    worker process either reuses the stored set or waits for the one being
+    generated instead of generating a second one.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.enabled = config.get('challenges', False)
+        self.max_pending = config.get('max_pending', 32)
+        self._executor = ThreadPoolExecutor(max_workers=config.get('workers', 1), thread_name_prefix='speculative')
+        self._jobs: Dict[str, Future] = {}
+        self._cancelled: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, session_id: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            if session_id in self._jobs:
+                return
+            if sum(not job.done() for job in self._jobs.values()) >= self.max_pending:
+                metrics.increment('speculation:challenges:dropped')
+                return
+            self._jobs[session_id] = self._executor.submit(self._generate, session_id)
+        metrics.increment('speculation:challenges:scheduled')
+
+    def get(self, session_id: str, deadline: Optional[float] = None) -> Optional[Dict[str, str]]:
+        """
+        The session's challenge set if one is stored or being generated,
+        waiting for a running job until `deadline`. Returns None if the
+        caller should generate it.
+        """
+        with self._lock:
+            job = self._jobs.get(session_id)
+        if job is None:
+            # Possibly stored by another worker process since this one loaded the session
+            return session_store.get_field(session_id, 'challenges_dict') or None
+        try:
+            questions = job.result(timeout=remaining_seconds(deadline))
+        except FutureTimeout:
+            raise DeadlineExceeded('Challenge generation did not finish before the deadline')
+        except (CancelledError, Exception) as e:
+            print(f"Speculative challenge generation failed: {e}")
+            return None
+        metrics.increment('speculation:challenges:attached')
+        return questions
+
+    def cancel(self, session_id: str):
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+            if job is None or job.done():
+                return
+            if job.cancel():
+                metrics.increment('speculation:challenges:cancelled')
+            else:
+                # Already running; its result is discarded when it finishes
+                self._cancelled.add(session_id)
+
+    def _generate(self, session_id: str) -> Dict[str, str]:
+        bind_usage(session_id, 'speculation')
+        try:
+            session = session_store.get_session(session_id)
+            if not session:
+                return {}
+            deadline = task_deadline('challenge_generation')
+
+            def create():
+                questions = generate_logic_challenges_dict(
+                    session_store.document_text(session_id), cached_content=context_cache.get(session_id), deadline=deadline
+                )
+                with self._lock:
+                    cancelled = session_id in self._cancelled
+                if cancelled:
+                    metrics.increment('speculation:challenges:wasted')
+                    raise CancelledError()
+                return questions
+            return session_store.get_or_create(session_id, 'challenges_dict', create, deadline)
+        finally:
+            with self._lock:
+                self._jobs.pop(session_id, None)
+                self._cancelled.discard(session_id)
+
+
+# Singleton instance
+speculative_challenges = SpeculativeChallenges(PARAMS.get('speculation'))
+session_store.on_expire(speculative_challenges.cancel)
@@ -1,11 +1,11 @@
-from config.settings import GEMINI_API_KEY
-from src.Agent.gemini_agent import Gemini
+from typing import List
+from src.Agent.provider_router import get_llm, llm_available
 
-def generate_summary(text: str, max_words: int = 150) -> str:
+def generate_summary(text: str, max_words: int = 150, deadline: float = None) -> str:
     """
-    Generate a concise summary (≤150 words) using Gemini agent.
+    Generate a concise summary (≤150 words) using the configured LLM provider.
     """
-    if not GEMINI_API_KEY:
+    if not llm_available():
         # Fallback: first N words
         import re
         words = re.findall(r'\w+|[.,!?;]', text)
@@ -14,6 +14,46 @@ def generate_summary(text: str, max_words: int = 150) -> str:
     prompt = (
         f"Summarize the following document in no more than {max_words} words.\n\nDocument:\n{text}\n\nSummary:"
     )
-    gemini = Gemini(api_key=GEMINI_API_KEY, id='gemini-1.5-flash-latest', temprature=0.1)
-    response = gemini.generate(prompt)
+    llm = get_llm('summary', prompt)
+    response = llm.generate(prompt, deadline=deadline)
+    return response.text.strip()
+
+
+def update_summary(previous_summary: str, new_text: str, max_words: int = 150, deadline: float = None) -> str:
+    """
+    Rolling summary update for text appended to a document: only the
+    previous summary and the new text are sent, not the whole document.
+    """
+    if not llm_available():
+        # Fallback: top up the previous summary with the first words of the new text
+        import re
+        words = previous_summary.split()
+        words += re.findall(r'\w+|[.,!?;]', new_text)[:max(0, max_words - len(words))]
+        return ' '.join(words)
+    prompt = (
+        f"Here is the summary of a document so far, followed by a newly added section. "
+        f"Update the summary to cover the whole document in no more than {max_words} words.\n\n"
+        f"Current summary:\n{previous_summary}\n\nNew section:\n{new_text}\n\nUpdated summary:"
+    )
+    llm = get_llm('summary', prompt)
+    response = llm.generate(prompt, deadline=deadline)
+    return response.text.strip()
+
+
+def combine_summaries(summaries: List[str], max_words: int = 150, deadline: float = None) -> str:
+    """
+    Summarize consecutive parts of a document from their summaries alone,
+    or shorten a single summary to `max_words`.
+    """
+    joined = "\n\n".join(summaries)
+    if not llm_available():
+        # Fallback: first N words of the part summaries
+        return ' '.join(joined.split()[:max_words])
+    prompt = (
+        f"Below are summaries of consecutive parts of a document. Combine them into a single summary "
+        f"of no more than {max_words} words, keeping the most important points.\n\n"
+        f"Part summaries:\n{joined}\n\nSummary:"
+    )
+    llm = get_llm('summary', prompt)
+    response = llm.generate(prompt, deadline=deadline)
     return response.text.strip()
@@ -0,0 +1,252 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
+from config.settings import PARAMS
+from src.components.summarizer import generate_summary, combine_summaries
+from src.pipeline.document_pipeline import heading_title
+from src.utils.chunk_utils import split_sentences
+from src.utils.metrics import metrics
+
+SUMMARY_TREE = PARAMS.get('summary_tree', {})
+
+
+def _word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _pack(text: str, chunk_words: int) -> List[str]:
+    # Consecutive whole sentences, about chunk_words each
+    chunks, current, count = [], [], 0
+    for sentence in split_sentences(text):
+        words = _word_count(sentence)
+        if current and count + words > chunk_words:
+            chunks.append(' '.join(current))
+            current, count = [], 0
+        current.append(sentence)
+        count += words
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def split_sections(text: str, chunk_words: int = 1200, chunks_per_section: int = 4) -> List[Tuple[str, List[str]]]:
+    """
+    Split a normalized document into (title, chunks) sections, at paragraphs
+    whose first line is a recognisable heading on its own (normalization puts
+    heading lines in paragraphs of their own) when there are any, otherwise
+    every `chunks_per_section` chunks.
+    Consecutive headed sections that fit in one chunk together are merged
+    (titled "Abstract / Introduction"), so short sections do not each cost a
+    summary call and a document of one chunk stays a single section.
+    """
+    groups: List[Tuple[Optional[str], List[str]]] = []
+    for paragraph in (p.strip() for p in text.split('\n\n')):
+        if not paragraph:
+            continue
+        heading = heading_title(paragraph.split('\n', 1)[0])
+        if heading or not groups:
+            groups.append((heading, []))
+        groups[-1][1].append(paragraph)
+
+    if len(groups) > 1 or (groups and groups[0][0]):
+        merged: List[Tuple[List[str], List[str], int]] = []
+        for title, paragraphs in groups:
+            words = sum(_word_count(p) for p in paragraphs)
+            if merged and merged[-1][2] + words <= chunk_words:
+                titles, previous, count = merged[-1]
+                merged[-1] = (titles + [title] if title and title not in titles else titles, previous + paragraphs, count + words)
+            else:
+                merged.append(([title] if title else [], paragraphs, words))
+        return [(' / '.join(titles) or f"Part {i + 1}", _pack('\n\n'.join(paragraphs), chunk_words))
+                for i, (titles, paragraphs, _) in enumerate(merged)]
+    chunks = _pack(text, chunk_words)
+    return [(f"Part {i // chunks_per_section + 1}", chunks[i:i + chunks_per_section])
+            for i in range(0, len(chunks), chunks_per_section)]
+
+
+class SummaryNode:
+    """
+    A summary of one span of the document. `variants` caches shortened
+    versions by word budget.
+    """
+
+    def __init__(self, title: str, summary: str, children: List['SummaryNode'] = None, variants: Dict[int, str] = None):
+        self.title = title
+        self.summary = summary
+        self.children = children or []
+        self.variants = variants or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'title': self.title,
+            'summary': self.summary,
+            'children': [child.to_dict() for child in self.children],
+            'variants': {str(k): v for k, v in self.variants.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SummaryNode':
+        return cls(
+            data['title'],
+            data['summary'],
+            [cls.from_dict(child) for child in data.get('children', [])],
+            {int(k): v for k, v in data.get('variants', {}).items()}
+        )
+
+
+class SummaryTree:
+    """
+    Chunk summaries, then section summaries, then the document summary,
+    built once at upload. Summaries of other lengths, or of one section, are
+    answered from the tree: the longest existing summary that fits the word
+    budget is returned (the node's own summary, or its children's or
+    grandchildren's concatenated), and only when even the shortest is too
+    long is an LLM call made to shorten it. Shortened versions are cached.
+    """
+
+    def __init__(self, root: SummaryNode, config: Dict[str, Any] = None):
+        self.root = root
+        self.config = config if config is not None else SUMMARY_TREE
+        # Set when a shortened variant was added, so callers know to persist the tree
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, text: str, deadline: float = None, config: Dict[str, Any] = None) -> 'SummaryTree':
+        config = config if config is not None else SUMMARY_TREE
+        document_words = config.get('document_summary_words', 150)
+        # A lone section's summary is the document summary, so it gets the document's length
+        sections = cls._build_sections(text, deadline, config, single_section_words=document_words)
+        if len(sections) == 1 and len(sections[0].children) == 1:
+            # Short document: a single call, as before the tree existed
+            summary = generate_summary(text, document_words, deadline=deadline)
+            sections[0].summary = sections[0].children[0].summary = summary
+        elif len(sections) == 1:
+            summary = sections[0].summary
+        else:
+            summary = combine_summaries([s.summary for s in sections], document_words, deadline=deadline)
+        return cls(SummaryNode('Document', summary, sections), config)
+
+    @staticmethod
+    def _build_sections(text: str, deadline: float, config: Dict[str, Any],
+                        single_section_words: Optional[int] = None) -> List[SummaryNode]:
+        split = split_sections(text, config.get('chunk_words', 1200), config.get('chunks_per_section', 4))
+        if len(split) == 1 and len(split[0][1]) <= 1:
+            # Too short to split; the caller summarizes it in one call
+            return [SummaryNode(split[0][0], '', [SummaryNode('Chunk 1', '')])]
+
+        chunk_words = config.get('chunk_summary_words', 80)
+        section_words = config.get('section_summary_words', 120)
+        if len(split) == 1 and single_section_words:
+            section_words = single_section_words
+        with ThreadPoolExecutor(max_workers=config.get('concurrency', 4)) as executor:
+            chunk_summaries = [
+                [executor.submit(contextvars.copy_context().run, generate_summary, chunk, chunk_words, deadline)
+                 for chunk in chunks]
+                for _, chunks in split
+            ]
+            sections = []
+            for (title, _), futures in zip(split, chunk_summaries):
+                children = [SummaryNode(f"Chunk {i + 1}", f.result()) for i, f in enumerate(futures)]
+                sections.append(SummaryNode(title, '', children))
+            # Multi-chunk sections are combined concurrently as well
+            combined = {
+                i: executor.submit(contextvars.copy_context().run, combine_summaries, [c.summary for c in s.children],
+                                   section_words, deadline)
+                for i, s in enumerate(sections) if len(s.children) > 1
+            }
+            for i, section in enumerate(sections):
+                section.summary = combined[i].result() if i in combined else section.children[0].summary
+        metrics.increment('summary_tree:chunks', sum(len(s.children) for s in sections))
+        return sections
+
+    def extend(self, text: str, deadline: float = None):
+        """
+        Add sections for text appended to the document and re-derive the
+        document summary from the section summaries only.
+        """
+        sections = self._build_sections(text, deadline, self.config)
+        if len(sections) == 1 and len(sections[0].children) == 1:
+            summary = generate_summary(text, self.config.get('section_summary_words', 120), deadline=deadline)
+            sections[0].summary = sections[0].children[0].summary = summary
+        offset = len(self.root.children)
+        for i, section in enumerate(sections):
+            if section.title.startswith('Part '):
+                section.title = f"Part {offset + i + 1}"
+        with self._lock:
+            self.root.children.extend(sections)
+            self.root.summary = combine_summaries(
+                [s.summary for s in self.root.children], self.config.get('document_summary_words', 150), deadline=deadline
+            )
+            self.root.variants = {}
+            self.dirty = True
+
+    @property
+    def summary(self) -> str:
+        return self.root.summary
+
+    def section_titles(self) -> List[str]:
+        return [section.title for section in self.root.children]
+
+    def find_section(self, section: Union[int, str]) -> SummaryNode:
+        """
+        A section by 1-based position or case-insensitive title prefix, with
+        or without the heading's number ("methods" matches "2 Methods"), of
+        any heading in a merged section ("methods" matches "Abstract / Methods").
+
+        Raises:
+            KeyError: If no section matches, or `section` is blank
+        """
+        sections = self.root.children
+        if isinstance(section, int) or str(section).isdigit():
+            position = int(section)
+            if 1 <= position <= len(sections):
+                return sections[position - 1]
+        elif str(section).strip():
+            wanted = str(section).strip().lower()
+            for node in sections:
+                for title in node.title.lower().split(' / '):
+                    if title.startswith(wanted) or re.sub(r'^[\d.]+\s+', '', title).startswith(wanted):
+                        return node
+        raise KeyError(f"Section {section!r} not found")
+
+    def summarize(self, max_words: Optional[int] = None, section: Union[int, str, None] = None,
+                  deadline: float = None) -> str:
+        """
+        Summary of the document (or one section) in at most `max_words` words.
+        """
+        node = self.root if section is None else self.find_section(section)
+        if max_words is None:
+            return node.summary
+        candidates = [node.summary, *node.variants.values()]
+        if node.children:
+            candidates.append(self._join(node.children, titled=node is self.root))
+            grandchildren = [g for child in node.children for g in child.children]
+            if grandchildren:
+                candidates.append(self._join(grandchildren, titled=False))
+        fitting = [c for c in candidates if c and _word_count(c) <= max_words]
+        if fitting:
+            return max(fitting, key=_word_count)
+
+        shortest = min((c for c in candidates if c), key=_word_count, default='')
+        shortened = combine_summaries([shortest], max_words, deadline=deadline)
+        metrics.increment('summary_tree:shortened')
+        with self._lock:
+            node.variants[max_words] = shortened
+            self.dirty = True
+        return shortened
+
+    @staticmethod
+    def _join(nodes: List[SummaryNode], titled: bool) -> str:
+        if titled:
+            return "\n\n".join(f"{n.title}: {n.summary}" for n in nodes)
+        return "\n\n".join(n.summary for n in nodes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.root.to_dict()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SummaryTree':
+        return cls(SummaryNode.from_dict(data))
@@ -0,0 +1,206 @@
+"""
+Bulk ingestion: parse, index and summarize a directory of documents into the
+artifact store ahead of time.
+
+    research-ingest papers/ --workers 8 --summary-concurrency 4
+
+Finished files are checkpointed in a manifest, so an interrupted run picks up
+where it stopped when started again with the same arguments.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+from config.settings import PARAMS
+from src.components.summary_tree import SUMMARY_TREE, SummaryTree
+from src.pipeline.document_pipeline import process_document
+from src.utils.artifact_store import ArtifactStore, artifact_store
+from src.utils.chunk_utils import DocumentIndex
+from src.utils.llm_utils import task_deadline
+from src.utils.parser_pool import ParserPool
+from src.utils.usage import bind_usage
+
+BULK_INGEST = PARAMS.get('bulk_ingest', {})
+PARSER_POOL = PARAMS.get('parser_pool', {})
+
+
+def find_documents(directory: str, extensions: List[str]) -> List[str]:
+    extensions = tuple(e.lower() for e in extensions)
+    found = []
+    for root, _, files in os.walk(directory):
+        found.extend(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+    return sorted(found)
+
+
+def file_key(path: str) -> str:
+    # A file counts as the same input while its path, size and mtime are unchanged
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Manifest:
+    """
+    Append-only JSONL checkpoint with one record per processed file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interruption
+                    self.records[record['key']] = record
+
+    def is_done(self, key: str) -> bool:
+        return self.records.get(key, {}).get('status') in ('ok', 'exists')
+
+    def record(self, record: Dict[str, Any]):
+        with self._lock:
+            self.records[record['key']] = record
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class Progress:
+    def __init__(self, total: int, stream=sys.stdout):
+        self.total = total
+        self.done = 0
+        self.counts: Dict[str, int] = {}
+        self.start = time.perf_counter()
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def update(self, record: Dict[str, Any]):
+        with self._lock:
+            self.done += 1
+            self.counts[record['status']] = self.counts.get(record['status'], 0) + 1
+            detail = f" {record['error']}" if record.get('error') else ''
+            print(f"[{self.done}/{self.total}] {record['status']:<7} {os.path.basename(record['path'])} "
+                  f"({record['seconds']:.1f}s, {self.rate():.1f} docs/min){detail}", file=self.stream, flush=True)
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return 60.0 * self.done / elapsed if elapsed else 0.0
+
+
+def _parse(path: str, pool: ParserPool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    text, normalization = process_document(path, os.path.basename(path), pool)
+    return {
+        'path': path,
+        'text': text,
+        'normalization': normalization,
+        'doc_hash': hashlib.sha1(text.encode('utf-8')).hexdigest(),
+        'start': start,
+    }
+
+
+def _summarize_and_store(document: Dict[str, Any], store: ArtifactStore, summarize: bool) -> str:
+    doc_hash = document['doc_hash']
+    if store.has_document(doc_hash) and (not summarize or store.load_summary(doc_hash) is not None):
+        return 'exists'
+    bind_usage(None, 'ingest')
+    index = DocumentIndex()
+    index.add_text(document['text'])
+    # One call at a time per document, so --summary-concurrency bounds the calls in flight
+    tree = SummaryTree.build(document['text'], deadline=task_deadline('summary'),
+                             config={**SUMMARY_TREE, 'concurrency': 1}) if summarize else None
+    store.save_document(doc_hash, document['text'], index, tree.summary if tree else None, {
+        'filename': os.path.basename(document['path']),
+        'normalization': document['normalization'],
+    })
+    if tree is not None:
+        store.save_summary_tree(doc_hash, tree.to_dict())
+    return 'ok'
+
+
+def ingest(paths: List[str], store: ArtifactStore, manifest: Manifest, workers: int = 4,
+           summary_concurrency: int = 4, summarize: bool = True, stream=sys.stdout) -> Dict[str, Any]:
+    """
+    Parse `paths` in a pool of `workers` parser processes and summarize them
+    with at most `summary_concurrency` LLM calls in flight. Files already in
+    the manifest are skipped.
+    """
+    pending = [p for p in paths if not manifest.is_done(file_key(p))]
+    print(f"{len(paths)} documents found, {len(paths) - len(pending)} already ingested, {len(pending)} to go",
+          file=stream, flush=True)
+    progress = Progress(len(pending), stream)
+    pool = ParserPool(**{**{k: v for k, v in PARSER_POOL.items() if k != 'enabled'}, 'workers': workers})
+
+    def finish(path: str, start: float, status: str, doc_hash: Optional[str] = None, error: Optional[str] = None):
+        record = {'key': file_key(path), 'path': path, 'status': status, 'doc_hash': doc_hash,
+                  'seconds': round(time.perf_counter() - start, 3)}
+        if error:
+            record['error'] = error
+        manifest.record(record)
+        progress.update(record)
+
+    def store_document(document: Dict[str, Any]):
+        try:
+            status = _summarize_and_store(document, store, summarize)
+            finish(document['path'], document['start'], status, document['doc_hash'])
+        except Exception as e:
+            finish(document['path'], document['start'], 'failed', document['doc_hash'], f"{type(e).__name__}: {e}")
+
+    try:
+        # Parsing and summarizing overlap: a file is handed to the summary
+        # workers as soon as it is parsed
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse') as parsers, \
+                ThreadPoolExecutor(max_workers=summary_concurrency, thread_name_prefix='summary') as summarizers:
+            parsing = {parsers.submit(_parse, path, pool): (path, time.perf_counter()) for path in pending}
+            for future in as_completed(parsing):
+                path, start = parsing[future]
+                try:
+                    summarizers.submit(store_document, future.result())
+                except Exception as e:
+                    finish(path, start, 'failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        pool.shutdown()
+
+    elapsed = time.perf_counter() - progress.start
+    totals = {
+        'documents': len(paths),
+        'processed': progress.done,
+        **progress.counts,
+        'seconds': round(elapsed, 1),
+        'docs_per_minute': round(progress.rate(), 1),
+    }
+    print(f"Done: {json.dumps(totals)}", file=stream, flush=True)
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Pre-process a directory of documents into the artifact store.')
+    parser.add_argument('directory', help='Directory to scan recursively for documents')
+    parser.add_argument('--workers', type=int, default=BULK_INGEST.get('workers', 4), help='Parser processes')
+    parser.add_argument('--summary-concurrency', type=int, default=BULK_INGEST.get('summary_concurrency', 4),
+                        help='Maximum summary calls in flight')
+    parser.add_argument('--store', default=None, help='Artifact store root (default: artifact_store.root in params.yaml)')
+    parser.add_argument('--manifest', default=None, help='Checkpoint manifest (default: <store>/ingest_manifest.jsonl)')
+    parser.add_argument('--no-summary', action='store_true', help='Only parse and index, skip summaries')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    store = ArtifactStore(args.store) if args.store else artifact_store
+    manifest = Manifest(args.manifest or os.path.join(store.root, 'ingest_manifest.jsonl'))
+    paths = find_documents(args.directory, BULK_INGEST.get('extensions', ['.pdf', '.txt']))
+    totals = ingest(paths, store, manifest, args.workers, args.summary_concurrency, not args.no_summary)
+    return 1 if totals.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
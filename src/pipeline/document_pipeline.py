@@ -0,0 +1,164 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config.settings import PARAMS
+from src.utils.file_utils import read_document_pages
+from src.utils.llm_utils import estimate_tokens
+from src.utils.metrics import metrics
+from src.utils.parser_pool import ParserPool, parser_pool
+
+NORMALIZATION = PARAMS.get('normalization', {})
+PARSER_POOL = PARAMS.get('parser_pool', {})
+
+_PAGE_NUMBER_RE = re.compile(r'^\W*(page\s*)?\d+(\s*(of|/)\s*\d+)?\W*$', re.IGNORECASE)
+_REFERENCES_RE = re.compile(r'^\s*(\d+\.?\s*)?(references|bibliography|works cited|literature cited)\s*:?\s*$', re.IGNORECASE | re.MULTILINE)
+# A section heading alone on its line, optionally numbered ("3.2 Results")
+_HEADING_LINE_RE = re.compile(
+    r'^[ \t]*((?:\d+(?:\.\d+)*\.?[ \t]+)?(abstract|introduction|background|related work|methods?|methodology|approach|'
+    r'experiments?|experimental setup|evaluation|results|discussion|conclusions?|limitations|future work))[ \t]*:?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def _line_key(line: str) -> str:
+    # Page numbers and dates vary between otherwise identical headers/footers
+    return re.sub(r'\d+', '#', re.sub(r'\s+', ' ', line.strip().lower()))
+
+
+def remove_boilerplate(pages: List[str], edge_lines: int = 3, min_repeat_fraction: float = 0.5) -> Tuple[List[str], int]:
+    """
+    Drop header/footer lines that repeat across pages, plus bare page numbers.
+    Only the first and last `edge_lines` lines of each page are considered.
+
+    Returns:
+        (cleaned pages, number of lines removed)
+    """
+    split_pages = [page.splitlines() for page in pages]
+    counts = Counter()
+    for lines in split_pages:
+        edges = lines[:edge_lines] + lines[-edge_lines:] if len(lines) > edge_lines else lines
+        counts.update({_line_key(line) for line in edges if line.strip()})
+    threshold = max(2, min_repeat_fraction * len(pages))
+    repeated = {key for key, count in counts.items() if count >= threshold}
+
+    cleaned, removed = [], 0
+    for lines in split_pages:
+        keep = []
+        for i, line in enumerate(lines):
+            at_edge = i < edge_lines or i >= len(lines) - edge_lines
+            if at_edge and (_line_key(line) in repeated or _PAGE_NUMBER_RE.match(line)):
+                removed += 1
+                continue
+            keep.append(line)
+        cleaned.append('\n'.join(keep))
+    return cleaned, removed
+
+
+def dehyphenate(text: str) -> str:
+    """
+    Rejoin words split across line breaks ("repre-\\nsentation").
+    """
+    return re.sub(r'(\w)-[ \t]*\n[ \t]*([a-z])', r'\1\2', text)
+
+
+def heading_title(line: str) -> Optional[str]:
+    """
+    The section heading `line` consists of, or None. Lowercase words are
+    taken for a wrapped line of running text rather than a heading.
+    """
+    match = _HEADING_LINE_RE.fullmatch(line)
+    if match is None or match.group(2)[0].islower():
+        return None
+    return match.group(1).title()
+
+
+def separate_headings(text: str) -> str:
+    """
+    Give every section heading line a paragraph of its own, so headings stay
+    recognisable after hard line breaks are unwrapped.
+    """
+    return _HEADING_LINE_RE.sub(lambda m: f"\n\n{m.group(0).strip()}\n\n" if heading_title(m.group(0)) else m.group(0), text)
+
+
+def collapse_whitespace(text: str) -> str:
+    """
+    Unwrap hard line breaks inside paragraphs and collapse whitespace runs,
+    keeping blank-line paragraph breaks.
+    """
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    text = re.sub(r' ?\n ?', '\n', text)
+    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return re.sub(r' {2,}', ' ', text).strip()
+
+
+def drop_references_section(text: str) -> Tuple[str, bool]:
+    """
+    Cut the document at a references/bibliography heading found in its
+    second half.
+    """
+    matches = [m for m in _REFERENCES_RE.finditer(text) if m.start() > len(text) // 2]
+    if not matches:
+        return text, False
+    return text[:matches[-1].start()].rstrip(), True
+
+
+def normalize_document(pages: List[str], drop_references: bool = True, edge_lines: int = 3,
+                       min_repeat_fraction: float = 0.5) -> Tuple[str, Dict]:
+    """
+    Normalize extracted text once at upload so every later prompt carries
+    fewer input tokens.
+
+    Returns:
+        (normalized text, stats including the estimated token savings)
+    """
+    original = '\n\n'.join(pages)
+    cleaned, boilerplate_removed = remove_boilerplate(pages, edge_lines, min_repeat_fraction) if len(pages) > 1 else (pages, 0)
+    text = dehyphenate('\n\n'.join(cleaned))
+    references_dropped = False
+    if drop_references:
+        # Headings are line based, so look for them before unwrapping lines
+        text, references_dropped = drop_references_section(text)
+    text = collapse_whitespace(separate_headings(text))
+
+    original_tokens, normalized_tokens = estimate_tokens(original), estimate_tokens(text)
+    stats = {
+        'original_tokens': original_tokens,
+        'normalized_tokens': normalized_tokens,
+        'tokens_saved': original_tokens - normalized_tokens,
+        'percent_saved': round(100.0 * (original_tokens - normalized_tokens) / original_tokens, 1) if original_tokens else 0.0,
+        'boilerplate_lines_removed': boilerplate_removed,
+        'references_dropped': references_dropped,
+    }
+    return text, stats
+
+
+def parse_document(file_path: str, filename: str, pool: ParserPool = None) -> List[str]:
+    """
+    Extract text from a saved upload, one entry per page. PDFs are parsed in
+    the sandboxed worker pool (`pool`, or the shared one) so a pathological
+    file cannot stall the API.
+    """
+    if PARSER_POOL.get('enabled', True) and filename.lower().endswith('.pdf'):
+        return (pool or parser_pool).parse(file_path, filename)
+    return read_document_pages(file_path, filename, PARSER_POOL.get('fallback_min_chars_per_page', 20))
+
+
+def process_document(file_path: str, filename: str, pool: ParserPool = None) -> Tuple[str, Dict]:
+    """
+    Upload stage: parse the file and normalize its text.
+
+    Returns:
+        (document text, normalization stats)
+    """
+    pages = parse_document(file_path, filename, pool)
+    if not NORMALIZATION.get('enabled', True):
+        return ''.join(pages), {}
+    text, stats = normalize_document(
+        pages,
+        drop_references=NORMALIZATION.get('drop_references', True),
+        edge_lines=NORMALIZATION.get('edge_lines', 3),
+        min_repeat_fraction=NORMALIZATION.get('min_repeat_fraction', 0.5)
+    )
+    metrics.increment('normalization:tokens_saved', stats['tokens_saved'])
+    return text, stats
@@ -0,0 +1,159 @@
+import threading
+from typing import Dict, Any, List, Optional
+from config.settings import PARAMS
+from src.Agent.provider_router import get_llm, llm_available
+from src.utils.chunk_utils import DocumentIndex, tokenize
+from src.utils.llm_utils import estimate_tokens
+from src.utils.session_store import session_store
+
+CONVERSATION = PARAMS.get('conversation', {})
+
+
+def _clip_words(text: str, max_words: int) -> str:
+    words = text.split()
+    return text if len(words) <= max_words else ' '.join(words[:max_words]) + ' ...'
+
+
+class Conversation:
+    """
+    Bounded conversation state for one session: recent turns verbatim,
+    a rolling memory summarizing older turns, and the sentence ids retrieved
+    for recent turns.
+    """
+
+    def __init__(self):
+        self.turns: List[tuple] = []
+        self.memory = ''
+        self.sentence_ids: List[int] = []
+        self.turn_count = 0
+        self.lock = threading.Lock()
+
+
+class ConversationManager:
+    """
+    Multi-turn Q&A where each follow-up sends a fixed-size prompt: rolling
+    memory + recent turns + a bounded set of retrieved sentences, never the
+    whole transcript or document. Turns beyond `recent_turns` are folded
+    into the memory `fold_every` at a time, so the summarizing call is made
+    once every few turns rather than on every turn.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.recent_turns = config.get('recent_turns', 3)
+        self.fold_every = max(1, config.get('fold_every', 3))
+        self.carry_sentences = config.get('carry_sentences', 3)
+        self.top_k = config.get('top_k', 3)
+        self.max_context_tokens = config.get('max_context_tokens', 1500)
+        self.memory_max_words = config.get('memory_max_words', 120)
+        self.history_answer_words = config.get('history_answer_words', 60)
+        self._guard = threading.Lock()
+
+    def ask(self, session_id: str, question: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Answer a question in the context of the session's conversation so far.
+        """
+        conversation = self._conversation(session_id)
+        session = session_store.get_session(session_id)
+        index = session.get('index')
+        if index is None:
+            index = DocumentIndex()
+            index.add_text(session.get('text', ''))
+            session_store.update_session(session_id, {'index': index})
+
+        with conversation.lock:
+            sentence_ids = self._retrieve(conversation, index, question)
+            context = self._bounded_context(index, sentence_ids)
+
+            if llm_available():
+                prompt = self._prompt(conversation, context, question)
+                answer = get_llm('ask', prompt).generate(prompt, deadline=deadline).text.strip()
+            else:
+                answer = index.sentences[sentence_ids[0]] if sentence_ids else "Sorry, I couldn't find an answer in the document."
+
+            self._remember(conversation, question, answer, sentence_ids, deadline)
+            return {'answer': answer, 'reference_snippet': context, 'turn': conversation.turn_count}
+
+    def reset(self, session_id: str):
+        session_store.update_session(session_id, {'conversation': None})
+
+    def _conversation(self, session_id: str) -> Conversation:
+        with self._guard:
+            conversation = session_store.get_session(session_id).get('conversation')
+            if conversation is None:
+                conversation = Conversation()
+                session_store.update_session(session_id, {'conversation': conversation})
+            return conversation
+
+    def _retrieve(self, conversation: Conversation, index: DocumentIndex, question: str) -> List[int]:
+        # Follow-ups ("what about the second one?") borrow terms from the previous
+        # question, but only to break ties between sentences matching this one
+        related = ''
+        if conversation.turns and len(tokenize(question)) < 4:
+            related = conversation.turns[-1][0]
+        fresh = index.search(question, self.top_k, related=related)
+        # Reuse what earlier turns retrieved instead of re-ranking from scratch
+        carried = [i for i in conversation.sentence_ids if i not in fresh][:self.carry_sentences]
+        return fresh + carried
+
+    def _bounded_context(self, index: DocumentIndex, sentence_ids: List[int]) -> str:
+        picked, tokens = [], 0
+        for sentence_id in sentence_ids:
+            sentence = index.sentences[sentence_id]
+            cost = estimate_tokens(sentence)
+            if picked and tokens + cost > self.max_context_tokens:
+                break
+            picked.append(sentence_id)
+            tokens += cost
+        # Keep document order so the excerpt reads naturally
+        return " ".join(index.sentences[i] for i in sorted(picked))
+
+    def _prompt(self, conversation: Conversation, context: str, question: str) -> str:
+        history = "\n".join(
+            f"User: {q}\nAssistant: {_clip_words(a, self.history_answer_words)}" for q, a in conversation.turns
+        )
+        return (
+            "You are a research document assistant in an ongoing conversation. Answer the latest question "
+            "strictly using the provided context; use the conversation only to resolve what the user refers to. "
+            "If the answer is not present in the context, say so.\n\n"
+            + (f"Earlier conversation (summary):\n{conversation.memory}\n\n" if conversation.memory else "")
+            + (f"Recent turns:\n{history}\n\n" if history else "")
+            + f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"
+        )
+
+    def _remember(self, conversation: Conversation, question: str, answer: str, sentence_ids: List[int], deadline: Optional[float]):
+        conversation.turns.append((question, answer))
+        if len(conversation.turns) >= self.recent_turns + self.fold_every:
+            # Fold the oldest turns into the memory in one call, keeping the most recent verbatim
+            folded = conversation.turns[:-self.recent_turns] if self.recent_turns else conversation.turns
+            conversation.memory = self._fold(conversation.memory, folded, deadline)
+            conversation.turns = conversation.turns[len(folded):]
+        conversation.sentence_ids = sentence_ids[:self.top_k + self.carry_sentences]
+        conversation.turn_count += 1
+
+    def _fold(self, memory: str, turns: List[tuple], deadline: Optional[float]) -> str:
+        if not llm_available():
+            return self._fold_locally(memory, turns)
+        exchanges = "\n".join(
+            f"User: {q}\nAssistant: {_clip_words(a, self.history_answer_words)}" for q, a in turns
+        )
+        prompt = (
+            f"Update this running summary of a conversation about a document with the new exchanges. "
+            f"Keep the topics, entities and conclusions the user may refer back to, in no more than {self.memory_max_words} words.\n\n"
+            f"Summary so far:\n{memory or '(empty)'}\n\nNew exchanges:\n{exchanges}\n\nUpdated summary:"
+        )
+        try:
+            return get_llm('ask', prompt).generate(prompt, deadline=deadline).text.strip()
+        except Exception as e:
+            print(f"Error updating conversation memory: {e}")
+            return self._fold_locally(memory, turns)
+
+    def _fold_locally(self, memory: str, turns: List[tuple]) -> str:
+        # Keep the most recent words of memory + exchanges
+        exchanges = ' '.join(f"Q: {q} A: {_clip_words(a, self.history_answer_words)}" for q, a in turns)
+        words = f"{memory} {exchanges}".split()
+        return ' '.join(words[-self.memory_max_words:])
+
+
+# Singleton instance
+conversation_manager = ConversationManager(CONVERSATION)
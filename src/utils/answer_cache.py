@@ -0,0 +1,107 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import PARAMS
+from src.utils.chunk_utils import STOPWORDS, tokenize
+from src.utils.metrics import metrics
+
+# Stopwords that change what is being asked
+_NEGATIONS = frozenset(('no', 'not', 'nor'))
+_CONTRACTION_RE = re.compile(r"n['\u2019]t\b")
+
+
+def question_terms(question: str) -> list:
+    """
+    Content words of a question in order, keeping negations ("isn't"
+    counts as "not").
+    """
+    text = _CONTRACTION_RE.sub(' not', question.lower())
+    return [w for w in tokenize(text, drop_stopwords=False) if w not in STOPWORDS or w in _NEGATIONS]
+
+
+def normalize_question(question: str) -> str:
+    """
+    Exact cache key for a question: case, punctuation and stopwords other
+    than negations are ignored; word order is kept, so "does A cause B" and
+    "does B cause A" stay distinct.
+    """
+    return ' '.join(question_terms(question))
+
+
+def _bigrams(terms: List[str]) -> Counter:
+    return Counter(zip(terms, terms[1:]))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b.get(term, 0) for term, count in a.items())
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class AnswerCache:
+    """
+    LRU cache of answers keyed by document content hash and normalized
+    question, so sessions on the same document share answers. With a
+    similarity threshold, a miss falls back to a cached question with exactly
+    the same content terms (negations included) whose word-bigram cosine
+    reaches the threshold, so only rephrasings with mostly the same word
+    order match.
+    """
+
+    def __init__(self, capacity: int = 2048, similarity_threshold: float = 0.0):
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+        self._entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._terms: Dict[str, Dict[str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, doc_hash: str, question: str) -> Optional[Dict[str, Any]]:
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get((doc_hash, key))
+            if entry is None and self.similarity_threshold:
+                key = self._nearest(doc_hash, question_terms(question))
+                entry = self._entries.get((doc_hash, key)) if key else None
+                if entry is not None:
+                    metrics.increment('answer_cache:near_hit')
+            if entry is None:
+                metrics.increment('answer_cache:miss')
+                return None
+            self._entries.move_to_end((doc_hash, key))
+        metrics.increment('answer_cache:hit')
+        return dict(entry)
+
+    def put(self, doc_hash: str, question: str, answer: Dict[str, Any]):
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[(doc_hash, key)] = dict(answer)
+            self._entries.move_to_end((doc_hash, key))
+            self._terms.setdefault(doc_hash, {})[key] = question_terms(question)
+            while len(self._entries) > self.capacity:
+                (old_doc, old_key), _ = self._entries.popitem(last=False)
+                terms = self._terms.get(old_doc, {})
+                terms.pop(old_key, None)
+                if not terms:
+                    self._terms.pop(old_doc, None)
+
+    def _nearest(self, doc_hash: str, terms: List[str]) -> Optional[str]:
+        best_key, best_score = None, self.similarity_threshold
+        vocabulary, bigrams = set(terms), _bigrams(terms)
+        for key, other in self._terms.get(doc_hash, {}).items():
+            # Any content word (or negation) present in only one question makes it a different question
+            if set(other) != vocabulary:
+                continue
+            score = _cosine(bigrams, _bigrams(other))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+
+# Singleton instance
+answer_cache = AnswerCache(
+    capacity=PARAMS.get('answer_cache', {}).get('capacity', 2048),
+    similarity_threshold=PARAMS.get('answer_cache', {}).get('near_duplicate_threshold', 0.0)
+)
@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+import numpy as np
+from config.settings import PARAMS
+from src.utils.chunk_utils import DocumentIndex
+from src.utils.shared_index import shared_indexes
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+ARTIFACT_STORE = PARAMS.get('artifact_store', {})
+
+_SESSION_ID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+_INDEX_ARRAYS = ('spans', 'terms', 'col_ptr', 'row_idx', 'length')
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ArtifactStore:
+    """
+    Processed documents on local disk, one directory per doc_hash:
+
+        text.txt     normalized document text
+        index/*.npy  DocumentIndex arrays (sentence spans, term postings),
+                     memory-mapped on load
+        summary.txt  document summary
+        summary_tree.json  chunk/section/document summaries
+        meta.json    filename, normalization stats, creation time
+
+    A document extended by an append stores only the appended text and its
+    index, with meta.json naming the `parent` document it continues.
+    meta.json is written last, so a document only counts as stored once all
+    of its files are complete. Sessions are small JSON records under
+    sessions/ pointing at a doc_hash, which lets a restarted process restore
+    them without re-parsing or re-summarizing anything.
+
+    When disabled, saves are no-ops and loads find nothing.
+    """
+
+    def __init__(self, root: str, enabled: bool = True):
+        self.root = root if os.path.isabs(root) else os.path.join(PROJECT_ROOT, root)
+        self.enabled = enabled
+        self._held = threading.local()
+
+    def path(self, doc_hash: str, name: str = '') -> str:
+        return os.path.join(self.root, 'documents', doc_hash[:2], doc_hash, name)
+
+    def session_path(self, session_id: str) -> str:
+        return os.path.join(self.root, 'sessions', f"{session_id}.json")
+
+    def has_document(self, doc_hash: str) -> bool:
+        return self.enabled and os.path.exists(self.path(doc_hash, 'meta.json'))
+
+    def save_document(self, doc_hash: str, text: str, index: DocumentIndex, summary: Optional[str] = None,
+                      metadata: Optional[Dict[str, Any]] = None):
+        if not self.enabled:
+            return
+        os.makedirs(self.path(doc_hash, 'index'), exist_ok=True)
+        _write_atomic(self.path(doc_hash, 'text.txt'), text.encode('utf-8'))
+        for name, array in index.to_arrays().items():
+            tmp_path = self.path(doc_hash, os.path.join('index', f"{name}.tmp-{os.getpid()}.npy"))
+            np.save(tmp_path, array)
+            os.replace(tmp_path, self.path(doc_hash, os.path.join('index', f"{name}.npy")))
+        if summary is not None:
+            self.save_summary(doc_hash, summary)
+        meta = {'doc_hash': doc_hash, 'created': time.time(), **(metadata or {})}
+        _write_atomic(self.path(doc_hash, 'meta.json'), json.dumps(meta).encode('utf-8'))
+
+    def save_summary(self, doc_hash: str, summary: str):
+        if self.enabled:
+            _write_atomic(self.path(doc_hash, 'summary.txt'), summary.encode('utf-8'))
+
+    def load_summary(self, doc_hash: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(doc_hash, 'summary.txt'), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save_summary_tree(self, doc_hash: str, tree: Dict[str, Any]):
+        if self.enabled:
+            _write_atomic(self.path(doc_hash, 'summary_tree.json'), json.dumps(tree).encode('utf-8'))
+
+    def load_summary_tree(self, doc_hash: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(doc_hash, 'summary_tree.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def load_document(self, doc_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {'text', 'index', 'summary', 'summary_tree', 'metadata'} or
+        None if the document is not stored. The summary tree is returned in
+        its dict form.
+        """
+        if not self.has_document(doc_hash):
+            return None
+        with open(self.path(doc_hash, 'meta.json'), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        with open(self.path(doc_hash, 'text.txt'), 'r', encoding='utf-8') as f:
+            own_text = f.read()
+        parent = None
+        if metadata.get('parent'):
+            parent = self.load_document(metadata['parent'])
+            if parent is None:
+                return None
+        text = own_text if parent is None else f"{parent['text']}\n\n{own_text}"
+        # Attach to the shared copy other workers use, publishing it on first use
+        index = shared_indexes.attach(doc_hash)
+        if index is None:
+            arrays = {name: np.load(self.path(doc_hash, os.path.join('index', f"{name}.npy")), mmap_mode='r')
+                      for name in _INDEX_ARRAYS}
+            index = shared_indexes.publish(doc_hash, own_text, arrays, metadata.get('parent'))
+        if index is None and parent is None:
+            index = DocumentIndex.from_arrays(own_text, arrays)
+        elif index is None:
+            index = parent['index'].materialize() if getattr(parent['index'], 'read_only', False) else parent['index']
+            index.add_text(own_text)
+        return {'text': text, 'index': index, 'summary': self.load_summary(doc_hash),
+                'summary_tree': self.load_summary_tree(doc_hash), 'metadata': metadata}
+
+    def save_session(self, session_id: str, record: Dict[str, Any]):
+        """
+        Persist a session's small, JSON-serializable fields. `record` must
+        include the session's doc_hash.
+        """
+        if not self.enabled or not _SESSION_ID_RE.fullmatch(session_id):
+            return
+        os.makedirs(os.path.dirname(self.session_path(session_id)), exist_ok=True)
+        _write_atomic(self.session_path(session_id), json.dumps(record).encode('utf-8'))
+
+    def touch_session(self, session_id: str):
+        """
+        Mark a session as used now. The record's mtime is its last use by any
+        worker process, which idle expiry goes by.
+        """
+        if not self.enabled or not _SESSION_ID_RE.fullmatch(session_id):
+            return
+        try:
+            os.utime(self.session_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def session_idle_seconds(self, session_id: str) -> Optional[float]:
+        """
+        Seconds since any worker last used or saved the session, or None if
+        it has no stored record.
+        """
+        if not self.enabled or not _SESSION_ID_RE.fullmatch(session_id):
+            return None
+        try:
+            return time.time() - os.path.getmtime(self.session_path(session_id))
+        except FileNotFoundError:
+            return None
+
+    def delete_session(self, session_id: str):
+        if not self.enabled or not _SESSION_ID_RE.fullmatch(session_id):
+            return
+        for path in (self.session_path(session_id), f"{self.session_path(session_id)}.lock"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def session_lock(self, session_id: str, timeout: Optional[float] = None):
+        """
+        Exclusive lock on a session shared by every process using this store
+        (an flock on sessions/<session_id>.json.lock). Raises TimeoutError if
+        it is not acquired within `timeout` seconds. Re-entrant within a
+        thread; a no-op when the store is disabled or flock is unavailable.
+        """
+        held = self._held.__dict__.setdefault('sessions', set())
+        if not self.enabled or fcntl is None or not _SESSION_ID_RE.fullmatch(session_id) or session_id in held:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.session_path(session_id)), exist_ok=True)
+        fd = os.open(f"{self.session_path(session_id)}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            give_up = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if give_up is not None and time.monotonic() >= give_up:
+                        raise TimeoutError(f"Session {session_id} is locked by another worker")
+                    time.sleep(0.05)
+            held.add(session_id)
+            try:
+                yield
+            finally:
+                held.discard(session_id)
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def load_session_record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        A session's stored record alone, without loading its document.
+        """
+        if not self.enabled or not _SESSION_ID_RE.fullmatch(session_id):
+            return None
+        try:
+            with open(self.session_path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Restore a session: its stored record plus its document's index and
+        summary, and its text unless the index is shared (the text is then
+        read from the index). Returns None if the session or its document is
+        unknown.
+        """
+        record = self.load_session_record(session_id)
+        if record is None:
+            return None
+        document = self.load_document(record.get('doc_hash', ''))
+        if document is None:
+            return None
+        session = {'summary': document['summary'] or '', 'index': document['index'],
+                   'summary_tree': document['summary_tree'], **record}
+        if not getattr(document['index'], 'read_only', False):
+            session['text'] = document['text']
+        return session
+
+
+# Singleton instance
+artifact_store = ArtifactStore(ARTIFACT_STORE.get('root', 'data/artifacts'), ARTIFACT_STORE.get('enabled', True))
@@ -0,0 +1,148 @@
+import re
+from itertools import chain
+from typing import Dict, List
+import numpy as np
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+""".split())
+
+_WORD_RE = re.compile(r'\w+')
+_VOWEL_RE = re.compile(r'[aeiouy]')
+
+
+def split_sentences(text: str) -> List[str]:
+    return re.split(r'(?<=[.!?])\s+', text)
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix-stripping stemmer (plurals, -ing, -ed, -ly), enough to match
+    "experiments"/"experiment" or "trained"/"training" without a dependency.
+    """
+    if len(word) <= 3 or word.endswith('ss') or not word.isalpha():
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('es') and len(word) > 4 and word[:-2].endswith(('s', 'x', 'z', 'ch', 'sh')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('us', 'is')):
+        word = word[:-1]
+    for suffix in ('ingly', 'edly', 'ing', 'ed', 'ly'):
+        base = word[:-len(suffix)]
+        if word.endswith(suffix) and len(base) >= 3 and _VOWEL_RE.search(base):
+            # running -> run, but keep "fall", "miss", "buzz"
+            if len(base) > 3 and base[-1] == base[-2] and base[-1] not in 'lsz':
+                base = base[:-1]
+            return base
+    return word
+
+
+def tokenize(text: str, drop_stopwords: bool = True, stem_words: bool = False) -> List[str]:
+    """
+    Lowercase word tokens, optionally without stopwords and stemmed.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if drop_stopwords:
+        words = [w for w in words if w not in STOPWORDS]
+    if stem_words:
+        words = [stem(w) for w in words]
+    return words
+
+
+class DocumentIndex:
+    """
+    Sentence-level inverted index over a document. Text can be appended
+    incrementally; only the new sentences are tokenized and posted.
+    """
+
+    def __init__(self):
+        self.sentences: List[str] = []
+        self.offsets: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        self.length = 0
+
+    def add_text(self, text: str) -> int:
+        """
+        Index text appended to the document. Returns the number of new sentences.
+        """
+        start = len(self.sentences)
+        if self.length:
+            self.length += 2  # documents are joined with a blank line
+        position = 0
+        for sentence in split_sentences(text):
+            position = text.find(sentence, position)
+            sentence_id = len(self.sentences)
+            self.sentences.append(sentence)
+            self.offsets.append(self.length + max(position, 0))
+            for term in set(tokenize(sentence, stem_words=True)):
+                self.postings.setdefault(term, []).append(sentence_id)
+            position += len(sentence)
+        self.length += len(text)
+        return len(self.sentences) - start
+
+    def search(self, query: str, top_k: int = 3, related: str = '') -> List[int]:
+        """
+        Sentence ids ranked by the number of distinct query terms they
+        contain, ties broken by the number of distinct `related` terms (such
+        as those of a previous question), then by document order.
+        """
+        terms = set(tokenize(query, stem_words=True))
+        extra = set(tokenize(related, stem_words=True)) - terms
+        scores: Dict[int, int] = {}
+        # One query term outweighs all related terms together
+        for term in terms:
+            for sentence_id in self.postings.get(term, ()):
+                scores[sentence_id] = scores.get(sentence_id, 0) + len(extra) + 1
+        for term in extra:
+            for sentence_id in self.postings.get(term, ()):
+                scores[sentence_id] = scores.get(sentence_id, 0) + 1
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))[:top_k]
+        # Like a plain overlap sort, fall back to leading sentences when nothing matches
+        for sentence_id in range(len(self.sentences)):
+            if len(ranked) >= top_k:
+                break
+            if sentence_id not in scores:
+                ranked.append(sentence_id)
+        return ranked
+
+    def context(self, query: str, top_k: int = 3) -> str:
+        return " ".join(self.sentences[i] for i in self.search(query, top_k))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Compact array form of the index: sentence spans into the document text
+        and column-compressed postings (terms, term -> sentence offsets, ids).
+        """
+        terms = list(self.postings)
+        col_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(self.postings[t]) for t in terms], out=col_ptr[1:])
+        return {
+            'spans': np.array([(o, len(s)) for o, s in zip(self.offsets, self.sentences)], dtype=np.int64).reshape(-1, 2),
+            'terms': np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8),
+            'col_ptr': col_ptr,
+            'row_idx': np.fromiter(chain.from_iterable(self.postings[t] for t in terms), dtype=np.int32, count=int(col_ptr[-1])),
+            'length': np.array([self.length], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, text: str, arrays: Dict[str, np.ndarray]) -> 'DocumentIndex':
+        """
+        Rebuild an index from `to_arrays()` output and the document text,
+        without re-tokenizing the document.
+        """
+        index = cls()
+        spans = arrays['spans']
+        index.offsets = spans[:, 0].tolist()
+        index.sentences = [text[o:o + n] for o, n in spans.tolist()]
+        raw_terms = bytes(arrays['terms']).decode('utf-8')
+        terms = raw_terms.split('\n') if raw_terms else []
+        col_ptr, row_idx = arrays['col_ptr'].tolist(), arrays['row_idx'].tolist()
+        index.postings = {term: row_idx[col_ptr[i]:col_ptr[i + 1]] for i, term in enumerate(terms)}
+        index.length = int(arrays['length'][0])
+        return index
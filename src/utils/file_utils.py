@@ -1,14 +1,51 @@
+from typing import List
+
 def read_txt_file(file_path: str) -> str:
     with open(file_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def read_pdf_file(file_path: str) -> str:
+def read_pdf_pages(file_path: str) -> List[str]:
     try:
         from PyPDF2 import PdfReader
     except ImportError:
         raise ImportError('PyPDF2 is required for PDF parsing')
     reader = PdfReader(file_path)
-    text = ''
-    for page in reader.pages:
-        text += page.extract_text() or ''
-    return text
+    return [page.extract_text() or '' for page in reader.pages]
+
+def read_pdf_file(file_path: str) -> str:
+    return ''.join(read_pdf_pages(file_path))
+
+def read_unstructured_pages(file_path: str) -> List[str]:
+    try:
+        from unstructured.partition.auto import partition
+    except ImportError:
+        raise ImportError('unstructured is required for fallback parsing')
+    pages = {}
+    for element in partition(filename=file_path):
+        page = getattr(element.metadata, 'page_number', None) or 1
+        pages.setdefault(page, []).append(str(element))
+    return ['\n'.join(pages[page]) for page in sorted(pages)]
+
+def read_document_pages(file_path: str, filename: str, fallback_min_chars_per_page: int = 20) -> List[str]:
+    """
+    Extract text from a saved upload, one entry per page. PDFs that PyPDF2
+    cannot read, or that come back nearly empty, are retried with unstructured.
+    """
+    if filename.lower().endswith('.txt'):
+        # Form feeds are the only page marker plain text has
+        return read_txt_file(file_path).split('\f')
+    if not filename.lower().endswith('.pdf'):
+        raise ValueError('Unsupported file type')
+    try:
+        pages = read_pdf_pages(file_path)
+        error = None
+    except Exception as e:
+        pages, error = [], e
+    if pages and sum(len(p.strip()) for p in pages) >= fallback_min_chars_per_page * len(pages):
+        return pages
+    try:
+        return read_unstructured_pages(file_path)
+    except ImportError:
+        if error is not None:
+            raise error
+        return pages
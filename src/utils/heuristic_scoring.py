@@ -0,0 +1,285 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from src.utils.chunk_utils import DocumentIndex, tokenize
+
+# Bound on the dense (texts x sentences) score block built per matrix product
+_MAX_BLOCK_CELLS = 1 << 22
+# Sentences retrieved per question as the evidence its answers are graded against
+_EVIDENCE_SENTENCES = 3
+# Answers with fewer content terms than this (beyond the question's own) are scored down proportionally
+_MIN_ANSWER_TERMS = 5
+
+
+class HeuristicScorer:
+    """
+    Offline scoring engine used when no LLM provider is configured. Sentences
+    and texts are sparse vectors of stemmed, stopword-free terms weighted by
+    idf; a whole batch of texts is scored against every sentence with one
+    sparse-dense product instead of per-sentence set intersections.
+
+    The score of a text against a sentence is the idf-weighted fraction of the
+    text's terms found in that sentence, so it lies in [0, 1]. Answers are
+    graded against the sentences retrieved for their question, on the terms
+    they add beyond the question itself.
+    """
+
+    def __init__(self, index: DocumentIndex):
+        if getattr(index, 'read_only', False) and index.parent is None:
+            # Postings read in place from the shared memory-mapped arrays, terms found by hash
+            self.sentences = index.sentences
+            self._term_columns = index.term_columns
+            arrays = index.to_arrays()
+            self.col_ptr, self.row_idx = arrays['col_ptr'], arrays['row_idx']
+        else:
+            if getattr(index, 'read_only', False):
+                # An appended document's postings are split across its chained parts
+                index = index.materialize()
+            self.sentences = list(index.sentences)
+            terms = list(index.postings)
+            vocab = {term: i for i, term in enumerate(terms)}
+            self._term_columns = lambda ts: np.fromiter((vocab.get(t, -1) for t in ts), dtype=np.int64, count=len(ts))
+            # Column-compressed term -> sentence postings
+            self.col_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum([len(index.postings[t]) for t in terms], out=self.col_ptr[1:])
+            self.row_idx = np.fromiter(chain.from_iterable(index.postings[t] for t in terms),
+                                       dtype=np.int64, count=int(self.col_ptr[-1]))
+        df = np.diff(self.col_ptr)
+        n = len(self.sentences)
+        self.idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+        # Terms the document never uses weigh like the rarest ones
+        self.unknown_idf = float(np.log(1.0 + n) + 1.0)
+        # Postings entries as sorted (term, sentence) keys, for vectorized membership tests
+        entry_terms = np.repeat(np.arange(len(df), dtype=np.int64), df)
+        self._keys = entry_terms * max(n, 1) + self.row_idx
+        self.sentence_weight = np.bincount(self.row_idx, weights=self.idf[entry_terms], minlength=n)
+
+    @classmethod
+    def from_text(cls, document_text: str) -> 'HeuristicScorer':
+        index = DocumentIndex()
+        index.add_text(document_text)
+        return cls(index)
+
+    def _vectorize(self, texts: List[str], exclude: List[set] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sparse (row, column, weight) triplets for `texts`, weights normalized
+        so each row sums to 1 including terms missing from the document. Also
+        returns the per-row weight of terms the document contains. Terms in
+        `exclude[row]` are left out of that row.
+        """
+        row_terms = [list(set(tokenize(text, stem_words=True)) - (exclude[row] if exclude else set()))
+                     for row, text in enumerate(texts)]
+        all_rows = np.repeat(np.arange(len(texts), dtype=np.int64), [len(terms) for terms in row_terms])
+        all_cols = self._term_columns(list(chain.from_iterable(row_terms)))
+        found = all_cols >= 0
+        unknown = np.bincount(all_rows[~found], minlength=len(texts)) * self.unknown_idf
+        rows, cols = all_rows[found], all_cols[found]
+        weights = self.idf[cols]
+        known = np.bincount(rows, weights=weights, minlength=len(texts))
+        total = known + unknown
+        weights = weights / np.where(total > 0, total, 1.0)[rows]
+        return rows, cols, weights, np.divide(known, total, out=np.zeros(len(texts)), where=total > 0)
+
+    def _coverage(self, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, n_rows: int) -> np.ndarray:
+        # Expand every (row, term) pair to the sentences posting that term
+        n_sent = len(self.sentences)
+        counts = self.col_ptr[cols + 1] - self.col_ptr[cols]
+        ends = np.cumsum(counts)
+        within = np.arange(int(ends[-1]) if len(ends) else 0) - np.repeat(ends - counts, counts)
+        sentence_ids = self.row_idx[np.repeat(self.col_ptr[cols], counts) + within]
+        flat = np.bincount(np.repeat(rows, counts) * n_sent + sentence_ids,
+                           weights=np.repeat(weights, counts), minlength=n_rows * n_sent)
+        return flat.reshape(n_rows, n_sent)
+
+    def _score_blocks(self, texts: List[str]):
+        """
+        (start, stop, coverage matrix) for consecutive blocks of `texts`
+        against every sentence, plus the document-level coverage per text.
+        """
+        rows, cols, weights, doc_score = self._vectorize(texts)
+        n_sent = len(self.sentences)
+        blocks = []
+        if n_sent and len(rows):
+            block = max(1, _MAX_BLOCK_CELLS // n_sent)
+            for start in range(0, len(texts), block):
+                stop = min(start + block, len(texts))
+                lo, hi = np.searchsorted(rows, [start, stop])
+                blocks.append((start, stop, self._coverage(rows[lo:hi] - start, cols[lo:hi], weights[lo:hi], stop - start)))
+        return blocks, doc_score
+
+    def _contains(self, sentence_ids: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # Whether each sentence contains the term in the same position (-1 contains nothing)
+        if not len(self._keys):
+            return np.zeros(len(cols), dtype=bool)
+        keys = cols * max(len(self.sentences), 1) + sentence_ids
+        positions = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return (sentence_ids >= 0) & (self._keys[positions] == keys)
+
+    def match(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score every text against every sentence.
+
+        Returns:
+            (best sentence id or -1 per text, coverage by that sentence,
+             coverage by the document as a whole)
+        """
+        best = np.full(len(texts), -1, dtype=np.int64)
+        best_score = np.zeros(len(texts))
+        blocks, doc_score = self._score_blocks(texts)
+        for start, stop, scores in blocks:
+            # argmax takes the first maximum, so ties go to the earlier sentence
+            block_best = scores.argmax(axis=1)
+            block_score = scores[np.arange(stop - start), block_best]
+            best[start:stop] = np.where(block_score > 0, block_best, -1)
+            best_score[start:stop] = block_score
+        return best, best_score, doc_score
+
+    def evidence(self, questions: List[str], top_k: int = _EVIDENCE_SENTENCES) -> np.ndarray:
+        """
+        The `top_k` sentences covering most of each question's terms, as a
+        (questions x top_k) array of sentence ids padded with -1.
+        """
+        evidence = np.full((len(questions), top_k), -1, dtype=np.int64)
+        blocks, _ = self._score_blocks(questions)
+        for start, stop, scores in blocks:
+            # Stable sort, so ties go to the earlier sentence
+            order = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+            found = np.take_along_axis(scores, order, axis=1) > 0
+            evidence[start:stop, :order.shape[1]] = np.where(found, order, -1)
+        return evidence
+
+    def score_answers(self, questions: List[str], answers: List[str], question_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Score answers against the evidence retrieved for their question
+        (`question_ids[i]` indexes `questions` for `answers[i]`), counting only
+        the terms an answer adds beyond its question.
+
+        Returns arrays per answer: the best supporting evidence sentence (or
+        -1), `support` (share of the answer's terms found in that sentence),
+        `recall` (share of the sentence's terms beyond the question found in
+        the answer), `terms` (number of added terms) and the combined `score`.
+        """
+        question_terms = [set(tokenize(q, stem_words=True)) for q in questions]
+        evidence = self.evidence(questions)
+        top_k = evidence.shape[1]
+        rows, cols, weights, _ = self._vectorize(answers, [question_terms[q] for q in question_ids])
+        n_terms = np.array([len(set(tokenize(a, stem_words=True)) - question_terms[q])
+                            for a, q in zip(answers, question_ids)], dtype=np.int64)
+
+        # Coverage of each answer by each of its question's evidence sentences
+        entry_evidence = evidence[question_ids[rows]]
+        hits = self._contains(entry_evidence.ravel(), np.repeat(cols, top_k)).reshape(-1, top_k)
+        coverage = np.zeros((len(answers), top_k))
+        np.add.at(coverage, rows, hits * weights[:, None])
+        slot = coverage.argmax(axis=1)
+        support = coverage[np.arange(len(answers)), slot]
+        best = np.where(support > 0, evidence[question_ids, slot], -1)
+
+        # Weight of each evidence sentence's terms, less those it shares with the question
+        question_weight = np.zeros(evidence.shape)
+        for q, terms in enumerate(question_terms):
+            q_cols = self._term_columns(list(terms))
+            q_cols = q_cols[q_cols >= 0]
+            for k, sentence_id in enumerate(evidence[q]):
+                if sentence_id >= 0 and len(q_cols):
+                    question_weight[q, k] = self.idf[q_cols][self._contains(np.full(len(q_cols), sentence_id), q_cols)].sum()
+        best_weight = np.where(best >= 0, self.sentence_weight[np.maximum(best, 0)] - question_weight[question_ids, slot], 0.0)
+        found = self._contains(best[rows], cols)
+        recall = np.bincount(rows, weights=self.idf[cols] * found, minlength=len(answers))
+        recall = np.divide(recall, best_weight, out=np.zeros(len(answers)), where=best_weight > 0).clip(0.0, 1.0)
+
+        brevity = np.minimum(1.0, n_terms / _MIN_ANSWER_TERMS)
+        score = np.round(brevity * (0.6 * support + 0.4 * recall), 2)
+        return {'best': best, 'support': support, 'recall': recall, 'terms': n_terms, 'score': score}
+
+    def answer(self, question: str) -> Dict[str, str]:
+        best, _, _ = self.match([question])
+        answer = self.sentences[best[0]] if best[0] >= 0 else "Sorry, I couldn't find an answer in the document."
+        return {'answer': answer, 'reference_snippet': answer}
+
+    def evaluate(self, question: str, user_answer: str) -> Dict[str, Any]:
+        scored = self.score_answers([question], [user_answer], np.zeros(1, dtype=np.int64))
+        best = scored['best'][0]
+        return {
+            'score': float(scored['score'][0]),
+            'justification': self._feedback(scored, 0) if user_answer.strip() else "No answer provided.",
+            'reference_snippet': self.sentences[best] if best >= 0 else ''
+        }
+
+    def _feedback(self, scored: Dict[str, np.ndarray], i: int) -> str:
+        best = scored['best'][i]
+        if best < 0:
+            return "Your answer does not draw on the passages relevant to this question."
+        passage = self.sentences[best]
+        passage = passage if len(passage) <= 200 else passage[:200] + '...'
+        text = (f"{round(scored['support'][i] * 100)}% of your answer's key terms are supported by the relevant passage "
+                f"'{passage}', and it covers {round(scored['recall'][i] * 100)}% of that passage's key terms.")
+        if scored['terms'][i] < _MIN_ANSWER_TERMS:
+            text += " The answer is too short to show understanding; explain your reasoning."
+        return text
+
+    def grade(self, questions: Dict[str, str], answer_sets: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Challenge feedback for many answer sets to the same questions, in the
+        same {q_key: {score, feedback}, 'overall': {...}} shape the LLM path
+        returns. All answers are scored in one batch.
+        """
+        keys = list(questions)
+        texts = [answers.get(k, '') for answers in answer_sets for k in keys]
+        scored = self.score_answers([questions[k] for k in keys], texts,
+                                    np.tile(np.arange(len(keys), dtype=np.int64), len(answer_sets)))
+
+        results = []
+        for s, answers in enumerate(answer_sets):
+            feedback, total = {}, 0.0
+            for q, key in enumerate(keys):
+                i = s * len(keys) + q
+                if not texts[i].strip():
+                    feedback[key] = {"score": 0.0, "feedback": "No answer provided. Please provide a detailed response."}
+                    continue
+                score = float(scored['score'][i])
+                total += score
+                feedback[key] = {"score": score, "feedback": self._feedback(scored, i)}
+            overall = round(total / len(keys), 2) if keys else 0.0
+            feedback['overall'] = {
+                "score": overall,
+                "feedback": "Heuristic grading by term overlap with the passages relevant to each question (no LLM configured)."
+            }
+            results.append(feedback)
+        return results
+
+
+class ScorerCache:
+    """
+    Small LRU of scorers keyed by document, so repeated offline requests on
+    one document build its term matrix once. Given the document's shared
+    index, the scorer reads its postings from the shared arrays instead of
+    re-indexing the text.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self.capacity = capacity
+        self._scorers: 'OrderedDict[str, HeuristicScorer]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_text: str, index=None) -> HeuristicScorer:
+        shared = getattr(index, 'read_only', False)
+        key = index.directory if shared else hashlib.sha1(document_text.encode('utf-8')).hexdigest()
+        with self._lock:
+            scorer = self._scorers.get(key)
+            if scorer is not None:
+                self._scorers.move_to_end(key)
+                return scorer
+        scorer = HeuristicScorer(index) if shared else HeuristicScorer.from_text(document_text)
+        with self._lock:
+            self._scorers[key] = scorer
+            while len(self._scorers) > self.capacity:
+                self._scorers.popitem(last=False)
+        return scorer
+
+
+# Singleton instance
+scorer_cache = ScorerCache()
@@ -0,0 +1,117 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError, create_model
+from config.settings import PARAMS
+
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when a model response cannot be validated against its schema,
+    even after the repair call.
+    """
+
+    def __init__(self, message: str, raw_text: str = '', partial: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.raw_text = raw_text
+        self.partial = partial or {}
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when an LLM call does not finish before its deadline.
+    """
+
+
+def task_deadline(task: str) -> Optional[float]:
+    """
+    Absolute deadline (on the time.monotonic clock) for a task, from
+    `deadlines` in params.yaml. Returns None if the task has no deadline.
+    """
+    seconds = PARAMS.get('deadlines', {}).get(task)
+    return time.monotonic() + seconds if seconds else None
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds left before `deadline`, raising DeadlineExceeded once it has passed.
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded before the LLM call was made')
+    return remaining
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for routing and
+    budgeting decisions without a count_tokens round trip.
+    """
+    return (len(text or '') + 3) // 4
+
+
+def extract_json(text: str) -> Any:
+    """
+    Parse JSON from a model response, tolerating markdown fences or
+    surrounding prose. Returns None if no JSON object can be found.
+    """
+    text = (text or '').strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find('{'), text.rfind('}') + 1
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return None
+
+
+def validate_structured(data: Any, schema: Type[BaseModel]) -> Tuple[Optional[BaseModel], List[str], List[str]]:
+    """
+    Validate parsed JSON against a pydantic schema.
+
+    Returns:
+        (model or None, invalid top-level field names, error messages)
+    """
+    if not isinstance(data, dict):
+        return None, list(schema.model_fields), ['response is not a JSON object']
+    try:
+        return schema.model_validate(data), [], []
+    except ValidationError as e:
+        invalid, messages = [], []
+        for error in e.errors():
+            loc = error.get('loc') or ('__root__',)
+            field = str(loc[0])
+            if field not in invalid:
+                invalid.append(field)
+            messages.append(f"{'.'.join(str(part) for part in loc)}: {error.get('msg')}")
+        return None, invalid, messages
+
+
+def repair_schema(schema: Type[BaseModel], fields: List[str]) -> Type[BaseModel]:
+    """
+    Build a schema containing only the given fields of `schema`, used to ask
+    the model for just the parts that failed validation.
+    """
+    fields = [f for f in fields if f in schema.model_fields] or list(schema.model_fields)
+    return create_model(
+        f'{schema.__name__}Repair',
+        **{name: (schema.model_fields[name].annotation, ...) for name in fields}
+    )
+
+
+def repair_prompt(prompt: str, previous_text: str, fields: List[str], messages: List[str]) -> str:
+    """
+    Build the follow-up prompt for a bounded repair call.
+    """
+    return (
+        f"{prompt}\n\n"
+        f"Your previous response was:\n{previous_text}\n\n"
+        f"It failed validation:\n" + "\n".join(f"- {m}" for m in messages) + "\n\n"
+        f"Return a JSON object containing only these corrected fields: {', '.join(fields)}."
+    )
@@ -0,0 +1,86 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional
+
+
+class Metrics:
+    """
+    In-process counters and rolling latency windows, shared by the agents,
+    routers and API layer.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Metrics, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._window = 200
+            cls._instance._counters = defaultdict(int)
+            cls._instance._latencies = {}
+            cls._instance._errors = {}
+        return cls._instance
+
+    def configure(self, window: int):
+        with self._lock:
+            self._window = window
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def record_latency(self, key: str, seconds: float, ok: bool = True):
+        with self._lock:
+            if key not in self._latencies:
+                self._latencies[key] = deque(maxlen=self._window)
+                self._errors[key] = deque(maxlen=self._window)
+            if ok:
+                self._latencies[key].append(seconds)
+            self._errors[key].append(0 if ok else 1)
+
+    def percentile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Return the q-th percentile (0-100) of recent successful latencies,
+        or None if fewer than `min_samples` have been recorded.
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def error_rate(self, key: str, min_samples: int = 1) -> float:
+        """
+        Return the share of recent calls that failed, or 0.0 if fewer than
+        `min_samples` calls have been recorded.
+        """
+        with self._lock:
+            errors = self._errors.get(key, ())
+            return sum(errors) / len(errors) if len(errors) >= max(1, min_samples) else 0.0
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def sample_count(self, key: str) -> int:
+        with self._lock:
+            return len(self._latencies.get(key, ()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            keys = list(self._latencies)
+        latencies = {
+            key: {
+                'count': self.sample_count(key),
+                'p50': self.percentile(key, 50),
+                'p95': self.percentile(key, 95),
+                'error_rate': self.error_rate(key),
+            }
+            for key in keys
+        }
+        return {'counters': counters, 'latencies': latencies}
+
+
+# Singleton instance
+metrics = Metrics()
@@ -0,0 +1,166 @@
+import atexit
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from config.settings import PARAMS
+from src.utils.metrics import metrics
+
+
+class DocumentParseError(ValueError):
+    """
+    Raised when a document cannot be parsed by the worker pool.
+    """
+
+
+class ParseTimeout(DocumentParseError):
+    """
+    Raised when parsing a document exceeds the per-job time limit.
+    """
+
+
+def _limit_memory(memory_limit_mb: int):
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows; workers run uncapped there
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker_main(conn, memory_limit_mb: int, max_jobs: int, recycle_rss_mb: int, fallback_min_chars: int):
+    from src.utils.file_utils import read_document_pages
+    if memory_limit_mb:
+        _limit_memory(memory_limit_mb)
+    jobs = 0
+    while True:
+        try:
+            file_path, filename = conn.recv()
+        except EOFError:
+            return
+        jobs += 1
+        exhausted = False
+        try:
+            result = ('ok', read_document_pages(file_path, filename, fallback_min_chars))
+        except MemoryError:
+            result, exhausted = ('error', 'Document exceeded the parser memory limit'), True
+        except Exception as e:
+            result = ('error', f"{type(e).__name__}: {e}")
+        # Retire after too many jobs or once the heap has grown too large
+        retire = exhausted or (max_jobs and jobs >= max_jobs) or (recycle_rss_mb and _peak_rss_mb() > recycle_rss_mb)
+        conn.send((*result, bool(retire)))
+        if retire:
+            return
+
+
+class _Worker:
+    def __init__(self, context, options: Dict[str, Any]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), kwargs=options, daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ParserPool:
+    """
+    Pool of reusable subprocesses that parse documents outside the API
+    process, with a wall-clock timeout and an address-space cap per job.
+    Workers are replaced after a timeout, a crash, `max_jobs_per_worker`
+    jobs or once their peak RSS passes `recycle_rss_mb`.
+    """
+
+    def __init__(self, workers: int = 2, timeout_seconds: float = 60, memory_limit_mb: int = 1024,
+                 max_jobs_per_worker: int = 50, recycle_rss_mb: int = 512, fallback_min_chars_per_page: int = 20):
+        self.size = workers
+        self.timeout_seconds = timeout_seconds
+        self.options = {
+            'memory_limit_mb': memory_limit_mb,
+            'max_jobs': max_jobs_per_worker,
+            'recycle_rss_mb': recycle_rss_mb,
+            'fallback_min_chars': fallback_min_chars_per_page,
+        }
+        # spawn: forking a multi-threaded server process is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._idle: 'queue.Queue[_Worker]' = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if not self._started:
+                for _ in range(self.size):
+                    self._idle.put(_Worker(self._context, self.options))
+                self._started = True
+                atexit.register(self.shutdown)
+
+    def parse(self, file_path: str, filename: str, timeout: Optional[float] = None) -> List[str]:
+        """
+        Parse a document in a worker and return its pages.
+
+        Raises:
+            ParseTimeout: If the job runs past the timeout
+            DocumentParseError: If the worker fails or dies while parsing
+        """
+        self._start()
+        timeout = timeout or self.timeout_seconds
+        # One budget for waiting on a worker and for the job itself
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ParseTimeout('No parser worker became available in time')
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._idle.put(worker)
+            raise ParseTimeout('No parser worker became available in time')
+
+        replace = True
+        try:
+            worker.conn.send((file_path, filename))
+            if not worker.conn.poll(remaining):
+                metrics.increment('parser_pool:timeout')
+                raise ParseTimeout(f"Parsing {filename} took longer than {timeout:g}s")
+            status, payload, retire = worker.conn.recv()
+            replace = retire
+            if retire:
+                metrics.increment('parser_pool:recycled')
+            if status != 'ok':
+                metrics.increment('parser_pool:error')
+                raise DocumentParseError(payload)
+            return payload
+        except (EOFError, OSError):
+            metrics.increment('parser_pool:crashed')
+            raise DocumentParseError(f"Parser worker died while parsing {filename}")
+        finally:
+            if replace:
+                worker.stop()
+                worker = _Worker(self._context, self.options)
+            self._idle.put(worker)
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+# Singleton instance; workers start on first use
+parser_pool = ParserPool(**{k: v for k, v in PARAMS.get('parser_pool', {}).items() if k != 'enabled'})
@@ -1,9 +1,30 @@
 import uuid
-from typing import Dict, Any
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+from config.settings import PARAMS
+from src.utils.artifact_store import artifact_store
+from src.utils.llm_utils import DeadlineExceeded, remaining_seconds
+from src.utils.metrics import metrics
+
+SESSIONS = PARAMS.get('sessions', {})
+
+# Session fields written to the artifact store; the document itself (text,
+# index, summary) is stored once per doc_hash
+PERSISTED_KEYS = ('filename', 'doc_hash', 'normalization', 'challenges_dict', 'challenge_answers', 'usage')
 
 class SessionStore:
     _instance = None
     _store: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+    # Sessions idle for longer than ttl_seconds expire; expiry listeners
+    # cancel any background work still pending for them
+    ttl_seconds: Optional[float] = SESSIONS.get('ttl_seconds')
+    sweep_interval_seconds: float = SESSIONS.get('sweep_interval_seconds', 300)
+    _last_access: Dict[str, float] = {}
+    _last_sweep = 0.0
+    _expiry_listeners: List[Callable[[str], None]] = []
+    _creation_locks: Dict[str, threading.Lock] = {}
 
     def __new__(cls):
         if cls._instance is None:
@@ -13,17 +34,160 @@ class SessionStore:
     def create_session(self, data: Dict[str, Any]) -> str:
         session_id = str(uuid.uuid4())
         self._store[session_id] = data
+        self._last_access[session_id] = time.monotonic()
+        self._persist(session_id)
+        self._maybe_sweep()
         return session_id
 
     def get_session(self, session_id: str) -> Dict[str, Any]:
-        return self._store.get(session_id, {})
+        session = self._store.get(session_id)
+        if session is None:
+            session = self._restore(session_id)
+        if session is not None:
+            self._last_access[session_id] = time.monotonic()
+            artifact_store.touch_session(session_id)
+        self._maybe_sweep()
+        return session or {}
 
     def update_session(self, session_id: str, data: Dict[str, Any]):
-        if session_id in self._store:
-            self._store[session_id].update(data)
+        session = self._store.get(session_id) if self.session_exists(session_id) else None
+        if session is not None:
+            session.update(data)
+            if any(key in data for key in PERSISTED_KEYS):
+                self._persist(session_id)
+
+    def get_field(self, session_id: str, key: str) -> Any:
+        """
+        A persisted field as last stored by any worker process, falling back
+        to this process's copy when nothing is stored.
+        """
+        stored = (artifact_store.load_session_record(session_id) or {}).get(key)
+        session = self._store.get(session_id)
+        if stored is None:
+            return (session or {}).get(key)
+        if session is not None:
+            session[key] = stored
+        return stored
+
+    def get_or_create(self, session_id: str, key: str, create: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """
+        A persisted field, created with `create()` at most once across worker
+        processes: under the session's lock, the stored record is re-read and
+        `create` only runs if no worker has stored the field yet.
+        """
+        with self._lock:
+            local_lock = self._creation_locks.setdefault(session_id, threading.Lock())
+        timeout = remaining_seconds(deadline)
+        if not local_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise DeadlineExceeded(f"Timed out waiting for another request to create {key}")
+        try:
+            with artifact_store.session_lock(session_id, remaining_seconds(deadline)):
+                value = self.get_field(session_id, key)
+                if value:
+                    metrics.increment(f"sessions:{key}:reused")
+                    return value
+                value = create()
+                self.update_session(session_id, {key: value})
+                return value
+        except TimeoutError as e:
+            raise DeadlineExceeded(str(e))
+        finally:
+            local_lock.release()
+
+    def apply(self, session_id: str, key: str, update: Callable[[Any], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Replace a persisted field with `update(current value)` under the
+        session's lock, re-reading the stored value first, so updates made
+        concurrently by other worker processes are not lost. Returns the new
+        value; raises TimeoutError if the lock is not acquired within
+        `timeout` seconds.
+        """
+        with artifact_store.session_lock(session_id, timeout):
+            value = update(self.get_field(session_id, key))
+            self.update_session(session_id, {key: value})
+            return value
+
+    def document_text(self, session_id: str) -> str:
+        """
+        A session's document text, decoded from its shared index when it has
+        one; only sessions whose index is not shared keep their own copy.
+        """
+        session = self.get_session(session_id)
+        index = session.get('index')
+        if getattr(index, 'read_only', False):
+            return index.text
+        return session.get('text', '')
 
     def session_exists(self, session_id: str) -> bool:
-        return session_id in self._store
+        return session_id in self._store or self._restore(session_id) is not None
+
+    def on_expire(self, listener: Callable[[str], None]):
+        self._expiry_listeners.append(listener)
+
+    def expire_idle(self, now: Optional[float] = None) -> List[str]:
+        """
+        Drop this process's copies of sessions it has not used for longer than
+        `ttl_seconds` and notify expiry listeners. A persisted record is only
+        deleted if no worker process has used it for that long either, as
+        re-checked under the session's lock; otherwise the session is restored
+        from it on next use. Returns the expired ids.
+        """
+        if not self.ttl_seconds:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [s for s, seen in self._last_access.items() if now - seen > self.ttl_seconds]
+            for session_id in expired:
+                self._store.pop(session_id, None)
+                self._last_access.pop(session_id, None)
+                self._creation_locks.pop(session_id, None)
+        for session_id in expired:
+            self._delete_if_idle(session_id)
+            for listener in self._expiry_listeners:
+                listener(session_id)
+        if expired:
+            metrics.increment('sessions:expired', len(expired))
+        return expired
+
+    def _delete_if_idle(self, session_id: str):
+        idle = artifact_store.session_idle_seconds(session_id)
+        if idle is None or idle <= self.ttl_seconds:
+            return
+        try:
+            # A worker holding the lock is using the session
+            with artifact_store.session_lock(session_id, timeout=0):
+                idle = artifact_store.session_idle_seconds(session_id)
+                if idle is not None and idle > self.ttl_seconds:
+                    artifact_store.delete_session(session_id)
+                    metrics.increment('sessions:deleted')
+        except TimeoutError:
+            pass
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if self.ttl_seconds and now - self._last_sweep > self.sweep_interval_seconds:
+            SessionStore._last_sweep = now
+            self.expire_idle(now)
+
+    def _persist(self, session_id: str):
+        session = self._store.get(session_id, {})
+        if session.get('doc_hash'):
+            # Merged with the stored record, so fields another worker stored are not dropped
+            with artifact_store.session_lock(session_id):
+                stored = artifact_store.load_session_record(session_id) or {}
+                artifact_store.save_session(session_id, {**stored, **{k: session[k] for k in PERSISTED_KEYS if k in session}})
+
+    def _restore(self, session_id: str) -> Optional[Dict[str, Any]]:
+        # Sessions from before a restart are loaded from disk on first access
+        with self._lock:
+            if session_id in self._store:
+                return self._store[session_id]
+            session = artifact_store.load_session(session_id)
+            if session is not None:
+                self._store[session_id] = session
+                self._last_access[session_id] = time.monotonic()
+                metrics.increment('sessions:restored')
+            return session
 
 # Singleton instance
 session_store = SessionStore()
@@ -0,0 +1,317 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from config.settings import PARAMS
+from src.utils.chunk_utils import DocumentIndex, tokenize
+
+SHARED_INDEX = PARAMS.get('shared_index', {})
+
+_ARRAYS = ('text', 'spans', 'byte_spans', 'term_hashes', 'terms', 'col_ptr', 'row_idx', 'length')
+
+
+def term_hash(term: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _byte_offsets(text: str) -> np.ndarray:
+    """
+    UTF-8 byte offset of every character position in `text` (length + 1).
+    """
+    if text.isascii():
+        return np.arange(len(text) + 1, dtype=np.int64)
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    widths = 1 + (code_points >= 0x80) + (code_points >= 0x800) + (code_points >= 0x10000)
+    offsets = np.zeros(len(text) + 1, dtype=np.int64)
+    np.cumsum(widths, out=offsets[1:])
+    return offsets
+
+
+class _SentenceView:
+    """
+    Sequence of sentences decoded on access from the shared text buffer,
+    following on from the sentences of `parent` if given.
+    """
+
+    def __init__(self, text: np.ndarray, byte_spans: np.ndarray, parent: Optional['_SentenceView'] = None):
+        self._text = text
+        self._byte_spans = byte_spans
+        self._parent = parent
+        self._base = len(parent) if parent is not None else 0
+
+    def __len__(self) -> int:
+        return self._base + len(self._byte_spans)
+
+    def __getitem__(self, i: int) -> str:
+        if i < self._base:
+            return self._parent[i]
+        start, size = self._byte_spans[i - self._base]
+        return self._text[start:start + size].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+
+class SharedDocumentIndex:
+    """
+    Read-only DocumentIndex backed by memory-mapped arrays in a shared
+    directory: every process attaching to the same document shares one copy
+    of its text, sentence spans and postings through the page cache. Terms
+    are looked up by binary search over sorted 64-bit term hashes, so no
+    per-process dict or lists are built.
+
+    A document extended by an append is published as its `parent` plus only
+    the appended text; its arrays hold that tail, with sentence ids and
+    offsets continuing from the parent's.
+    """
+    read_only = True
+
+    def __init__(self, directory: str, parent: Optional['SharedDocumentIndex'] = None):
+        self.directory = directory
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in _ARRAYS}
+        self._arrays = arrays
+        self.parent = parent
+        self.sentences = _SentenceView(arrays['text'], arrays['byte_spans'], parent.sentences if parent else None)
+        # Documents are joined with a blank line, as in DocumentIndex.add_text
+        self._start = parent.length + 2 if parent is not None else 0
+        self.length = self._start + int(arrays['length'][0])
+
+    @property
+    def offsets(self) -> np.ndarray:
+        own = self._arrays['spans'][:, 0]
+        if self.parent is None:
+            return own
+        return np.concatenate([self.parent.offsets, own + self._start])
+
+    @property
+    def text(self) -> str:
+        own = self._arrays['text'].tobytes().decode('utf-8')
+        return own if self.parent is None else f"{self.parent.text}\n\n{own}"
+
+    def term_columns(self, terms: List[str]) -> np.ndarray:
+        """
+        Postings column (in this index's own to_arrays() form) of each term,
+        or -1 for terms it does not contain.
+        """
+        hashes = np.array([term_hash(t) for t in terms], dtype=np.uint64)
+        sorted_hashes = self._arrays['term_hashes']
+        if not len(sorted_hashes):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+        return np.where(sorted_hashes[positions] == hashes, positions, -1)
+
+    def _columns(self, terms) -> np.ndarray:
+        columns = self.term_columns(list(terms))
+        return columns[columns >= 0]
+
+    def _counts(self, terms) -> np.ndarray:
+        col_ptr, row_idx = self._arrays['col_ptr'], self._arrays['row_idx']
+        segments = [row_idx[col_ptr[c]:col_ptr[c + 1]] for c in self._columns(terms)]
+        own_count = len(self._arrays['byte_spans'])
+        counts = (np.bincount(np.concatenate(segments), minlength=own_count) if segments
+                  else np.zeros(own_count, dtype=np.int64))
+        if self.parent is None:
+            return counts
+        return np.concatenate([self.parent._counts(terms), counts])
+
+    def search(self, query: str, top_k: int = 3, related: str = '') -> List[int]:
+        """
+        Same ranking as DocumentIndex.search: distinct query terms per
+        sentence, then distinct `related` terms, ties by document order,
+        leading sentences as fallback.
+        """
+        terms = set(tokenize(query, stem_words=True))
+        extra = set(tokenize(related, stem_words=True)) - terms
+        ranked: List[int] = []
+        if len(self.sentences):
+            counts = self._counts(terms) * (len(extra) + 1) + self._counts(extra)
+            matched = np.flatnonzero(counts)
+            # lexsort sorts by the last key first: score descending, then sentence id
+            ranked = matched[np.lexsort((matched, -counts[matched]))][:top_k].tolist()
+        for sentence_id in range(len(self.sentences)):
+            if len(ranked) >= top_k:
+                break
+            if sentence_id not in ranked:
+                ranked.append(sentence_id)
+        return ranked
+
+    def context(self, query: str, top_k: int = 3) -> str:
+        return " ".join(self.sentences[i] for i in self.search(query, top_k))
+
+    def add_text(self, text: str) -> int:
+        raise TypeError('Shared indexes are read-only; use materialize() to get a writable copy')
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        if self.parent is not None:
+            return self.materialize().to_arrays()
+        return {name: self._arrays[name] for name in ('spans', 'terms', 'col_ptr', 'row_idx', 'length')}
+
+    def materialize(self) -> DocumentIndex:
+        """
+        A private, writable DocumentIndex with the same contents.
+        """
+        if self.parent is None:
+            return DocumentIndex.from_arrays(self.text, self.to_arrays())
+        index = self.parent.materialize()
+        index.add_text(self._arrays['text'].tobytes().decode('utf-8'))
+        return index
+
+
+class SharedIndexRegistry:
+    """
+    Registry of read-only document indexes published as .npy files under a
+    shared directory (by default on /dev/shm), one subdirectory per doc_hash.
+    A document is published once by whichever worker sees it first; every
+    other worker process attaches to the same files without copying them.
+    Subdirectories appear atomically, so their presence is the registry.
+    An appended document is published as a tail chained to its parent's
+    subdirectory, which is kept as long as a document chained to it is.
+    """
+
+    def __init__(self, root: str, enabled: bool = True, max_documents: int = 500):
+        self.root = root
+        self.enabled = enabled
+        self.max_documents = max_documents
+        self._attached: 'OrderedDict[str, SharedDocumentIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, doc_hash: str) -> str:
+        return os.path.join(self.root, doc_hash)
+
+    def documents(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in os.listdir(self.root) if '.tmp-' not in name]
+
+    def attach(self, doc_hash: str) -> Optional[SharedDocumentIndex]:
+        if not self.enabled or not doc_hash:
+            return None
+        with self._lock:
+            index = self._attached.get(doc_hash)
+            if index is not None:
+                self._attached.move_to_end(doc_hash)
+                return index
+        parent_hash = self._parent(doc_hash)
+        parent = self.attach(parent_hash) if parent_hash else None
+        if parent_hash and parent is None:
+            return None
+        try:
+            index = SharedDocumentIndex(self.path(doc_hash), parent)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            self._attached[doc_hash] = index
+            while len(self._attached) > self.max_documents:
+                self._attached.popitem(last=False)
+        return index
+
+    def publish(self, doc_hash: str, text: str, arrays: Dict[str, np.ndarray],
+                parent: Optional[str] = None) -> Optional[SharedDocumentIndex]:
+        """
+        Publish a document's index (in DocumentIndex.to_arrays() form) unless
+        it is already published, and attach to it. With `parent`, `text` and
+        `arrays` cover only the text appended to that published document.
+        Returns None when sharing is disabled, the parent is not published or
+        the shared directory is unusable.
+        """
+        if not self.enabled or not doc_hash:
+            return None
+        existing = self.attach(doc_hash)
+        if existing is not None:
+            return existing
+        if parent and self.attach(parent) is None:
+            return None
+        try:
+            self._write(doc_hash, text, arrays, parent)
+        except OSError as e:
+            print(f"Error publishing shared index: {e}")
+            return None
+        self._evict()
+        return self.attach(doc_hash)
+
+    def _parent(self, doc_hash: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path(doc_hash), 'parent'), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write(self, doc_hash: str, text: str, arrays: Dict[str, np.ndarray], parent: Optional[str] = None):
+        raw_terms = bytes(arrays['terms']).decode('utf-8')
+        terms = raw_terms.split('\n') if raw_terms else []
+        hashes = np.array([term_hash(t) for t in terms], dtype=np.uint64)
+        order = np.argsort(hashes, kind='stable')
+
+        # Reorder the postings columns to follow the sorted hashes
+        col_ptr = np.asarray(arrays['col_ptr'], dtype=np.int64)
+        row_idx = np.asarray(arrays['row_idx'])
+        lengths = np.diff(col_ptr)[order]
+        new_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_ptr[1:])
+        within = np.arange(int(new_ptr[-1])) - np.repeat(new_ptr[:-1], lengths)
+        new_rows = row_idx[np.repeat(col_ptr[:-1][order], lengths) + within]
+
+        spans = np.asarray(arrays['spans'], dtype=np.int64).reshape(-1, 2)
+        offsets = _byte_offsets(text)
+        byte_spans = np.stack([offsets[spans[:, 0]], offsets[spans[:, 0] + spans[:, 1]] - offsets[spans[:, 0]]], axis=1)
+
+        shared = {
+            'text': np.frombuffer(text.encode('utf-8'), dtype=np.uint8),
+            'spans': spans,
+            'byte_spans': byte_spans.reshape(-1, 2),
+            'term_hashes': hashes[order],
+            'terms': np.frombuffer('\n'.join(terms[i] for i in order).encode('utf-8'), dtype=np.uint8),
+            'col_ptr': new_ptr,
+            'row_idx': new_rows.astype(np.int32),
+            'length': np.asarray(arrays['length'], dtype=np.int64),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f"{doc_hash}.tmp-", dir=self.root)
+        try:
+            for name, array in shared.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+            if parent:
+                with open(os.path.join(tmp_dir, 'parent'), 'w', encoding='utf-8') as f:
+                    f.write(parent)
+            # Another worker may have published the same document meanwhile
+            os.rename(tmp_dir, self.path(doc_hash))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(self.path(doc_hash)):
+                raise
+
+    def _evict(self):
+        # Processes that still map an evicted document keep a valid mapping
+        documents = self.documents()
+        if len(documents) <= self.max_documents:
+            return
+        documents.sort(key=lambda d: os.path.getmtime(self.path(d)))
+        excess = len(documents) - self.max_documents
+        # Parents of the documents kept are still needed to attach them
+        needed = set()
+        for doc_hash in documents[excess:]:
+            parent = self._parent(doc_hash)
+            while parent and parent not in needed:
+                needed.add(parent)
+                parent = self._parent(parent)
+        for doc_hash in documents[:excess]:
+            if doc_hash not in needed:
+                shutil.rmtree(self.path(doc_hash), ignore_errors=True)
+
+
+def _default_root() -> str:
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'research-summarization')
+
+
+# Singleton instance
+shared_indexes = SharedIndexRegistry(
+    SHARED_INDEX.get('root') or _default_root(),
+    SHARED_INDEX.get('enabled', True),
+    SHARED_INDEX.get('max_documents', 500)
+)
@@ -0,0 +1,262 @@
+import contextvars
+import threading
+import time
+from typing import Dict, Any, Iterator, Optional
+from config.settings import PARAMS
+from src.utils.metrics import metrics
+from src.utils.session_store import session_store
+
+USAGE = PARAMS.get('usage', {})
+
+# Cheapest last: each mode also applies the ones before it
+MODES = ('full', 'retrieval_only', 'fast_model', 'heuristic')
+
+
+class UsageScope:
+    """
+    The session and route LLM calls are billed to. Set per request with
+    `bind_usage`; threads started for the request inherit it through a copied
+    context.
+    """
+
+    def __init__(self, session_id: Optional[str], route: str):
+        self.session_id = session_id
+        self.route = route
+        self.usage = _empty()
+
+
+_scope: contextvars.ContextVar[Optional[UsageScope]] = contextvars.ContextVar('usage_scope', default=None)
+
+
+def bind_usage(session_id: Optional[str], route: str) -> UsageScope:
+    """
+    Bill LLM calls made from the current context to `session_id` and `route`.
+    """
+    scope = UsageScope(session_id, route)
+    _scope.set(scope)
+    return scope
+
+
+def in_current_context(iterator: Iterator) -> Iterator:
+    """
+    Iterate `iterator` in the current context, for streaming response bodies
+    that are consumed after the request handler has returned.
+    """
+    # Captured now, not on the first next() of a generator
+    context = contextvars.copy_context()
+
+    def iterate():
+        try:
+            while True:
+                try:
+                    item = context.run(next, iterator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            # Closing the wrapper (client disconnect) closes the wrapped generator too
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                context.run(close)
+    return iterate()
+
+
+def _empty() -> Dict[str, Any]:
+    return {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cost_usd': 0.0}
+
+
+def _add(total: Dict[str, Any], usage: Dict[str, Any]):
+    for key, value in usage.items():
+        total[key] += value
+
+
+def _added(stored: Optional[Dict[str, Any]], usage: Dict[str, Any]) -> Dict[str, Any]:
+    total = {**_empty(), **(stored or {})}
+    _add(total, usage)
+    return total
+
+
+class UsageTracker:
+    """
+    Token usage and cost of every LLM call, from the providers' response
+    metadata, aggregated per session, route and model, plus a global total
+    for the current budget window. When a session or the global window nears its
+    budget (USD), calls degrade step by step to retrieval-only context, then
+    the fast model, then the local heuristic fallbacks, instead of failing.
+
+    Session totals are added to the session's persisted record, so every
+    worker process bills and budgets a session against the same total. Route,
+    model and global totals are kept per process: the global budget limits
+    each worker separately.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.prices = config.get('prices', {})
+        budgets = config.get('budgets', {})
+        self.session_budget = budgets.get('session_usd')
+        self.global_budget = budgets.get('global_usd')
+        self.window_seconds = budgets.get('global_window_seconds', 86400)
+        self.degrade_at = config.get('degrade_at', {'retrieval_only': 0.5, 'fast_model': 0.8, 'heuristic': 1.0})
+        self.retrieval_top_k = config.get('retrieval_top_k', 8)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # Session usage not yet added to the stored record
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._total = _empty()
+        self._window = _empty()
+        self._window_start = time.time()
+
+    def price(self, model: str) -> Dict[str, float]:
+        # Longest matching prefix, so 'gemini-1.5-flash' covers its -latest/-002 variants
+        model = model.split('/')[-1]
+        matches = [name for name in self.prices if model.startswith(name)]
+        return self.prices[max(matches, key=len)] if matches else self.prices.get('default', {})
+
+    def record(self, model: str, prompt_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        """
+        Record one call's usage against the current scope. `cached_tokens`
+        are the part of `prompt_tokens` served from a context cache.
+        """
+        price = self.price(model)
+        cost = ((prompt_tokens - cached_tokens) * price.get('input', 0.0)
+                + cached_tokens * price.get('cached', price.get('input', 0.0))
+                + output_tokens * price.get('output', 0.0)) / 1e6
+        usage = {'calls': 1, 'prompt_tokens': prompt_tokens, 'output_tokens': output_tokens,
+                 'cached_tokens': cached_tokens, 'cost_usd': cost}
+        scope = _scope.get()
+        route = scope.route if scope else 'background'
+        with self._lock:
+            self._roll_window()
+            _add(self._total, usage)
+            _add(self._window, usage)
+            _add(self._routes.setdefault(route, _empty()), usage)
+            _add(self._models.setdefault(model, _empty()), usage)
+            if scope is not None:
+                _add(scope.usage, usage)
+        if scope is not None and scope.session_id:
+            self._bill_session(scope.session_id, usage)
+        metrics.increment('usage:prompt_tokens', prompt_tokens)
+        metrics.increment('usage:output_tokens', output_tokens)
+
+    def assign_session(self, session_id: str):
+        """
+        Bill the current scope to a session created during the request
+        (uploads), including the calls it already made.
+        """
+        scope = _scope.get()
+        if scope is None or scope.session_id:
+            return
+        with self._lock:
+            scope.session_id = session_id
+            usage = dict(scope.usage)
+        self._bill_session(session_id, usage)
+
+    def _bill_session(self, session_id: str, usage: Dict[str, Any]):
+        with self._lock:
+            _add(self._sessions.setdefault(session_id, _empty()), usage)
+            _add(self._pending.setdefault(session_id, _empty()), usage)
+        self._flush(session_id)
+
+    def _flush(self, session_id: str):
+        """
+        Add the session's pending usage to its stored record. Calls run on
+        hedging threads while the requesting thread may hold the session's
+        lock (say, creating its challenge set), so the lock is not waited
+        for; usage stays pending until a later flush gets it.
+        """
+        with self._lock:
+            delta = self._pending.pop(session_id, None)
+        if delta is None:
+            return
+        try:
+            total = session_store.apply(session_id, 'usage', lambda stored: _added(stored, delta), timeout=0)
+        except TimeoutError:
+            with self._lock:
+                _add(self._pending.setdefault(session_id, _empty()), delta)
+            return
+        with self._lock:
+            self._sessions[session_id] = _added(total, self._pending.get(session_id, {}))
+
+    def forget(self, session_id: str):
+        # Not flushed: that would restore the session this process just expired
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+
+    def mode(self, session_id: Optional[str] = None) -> str:
+        """
+        The cheapest mode either budget currently calls for, for `session_id`
+        or the current scope's session. The session's total is as of this
+        process's last call for it, or as stored when it has made none.
+        """
+        if session_id is None:
+            scope = _scope.get()
+            session_id = scope.session_id if scope else None
+        if session_id and session_id in self._pending:
+            self._flush(session_id)
+        elif session_id and self.session_budget and session_id not in self._sessions:
+            self._load_session(session_id)
+        with self._lock:
+            self._roll_window()
+            spent = [self._window['cost_usd'] / self.global_budget if self.global_budget else 0.0]
+            if self.session_budget and session_id in self._sessions:
+                spent.append(self._sessions[session_id]['cost_usd'] / self.session_budget)
+        fraction = max(spent)
+        mode = 'full'
+        for candidate in MODES[1:]:
+            threshold = self.degrade_at.get(candidate)
+            if threshold is not None and fraction >= threshold:
+                mode = candidate
+        return mode
+
+    def degraded(self, mode: str) -> bool:
+        """
+        Whether calls from the current scope should use `mode` (or cheaper).
+        """
+        degraded = MODES.index(self.mode()) >= MODES.index(mode)
+        if degraded:
+            metrics.increment(f"usage:degraded:{mode}")
+        return degraded
+
+    def session_usage(self, session_id: str) -> Dict[str, Any]:
+        # Fresh from the record, including calls billed by other workers
+        self._flush(session_id)
+        self._load_session(session_id)
+        with self._lock:
+            usage = dict(self._sessions.get(session_id, _empty()))
+        return {'usage': usage, 'budget_usd': self.session_budget, 'mode': self.mode(session_id)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        mode = self.mode('')
+        with self._lock:
+            self._roll_window()
+            return {
+                'total': dict(self._total),
+                'window': {**self._window, 'started': self._window_start, 'seconds': self.window_seconds,
+                           'budget_usd': self.global_budget},
+                'routes': {k: dict(v) for k, v in self._routes.items()},
+                'models': {k: dict(v) for k, v in self._models.items()},
+                'sessions': len(self._sessions),
+                'mode': mode,
+            }
+
+    def _load_session(self, session_id: str):
+        stored = session_store.get_field(session_id, 'usage')
+        if stored:
+            with self._lock:
+                self._sessions[session_id] = _added(stored, self._pending.get(session_id, {}))
+
+    def _roll_window(self):
+        # Caller holds the lock
+        now = time.time()
+        if now - self._window_start > self.window_seconds:
+            self._window = _empty()
+            self._window_start = now
+
+
+# Singleton instance
+usage_tracker = UsageTracker(USAGE)
+session_store.on_expire(usage_tracker.forget)
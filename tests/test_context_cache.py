@@ -0,0 +1,80 @@
+"""
+Offline tests for the per-session Gemini context cache against a stub
+cache API; no API key or network access is needed.
+"""
+import datetime
+import time
+
+import pytest
+
+import src.components.context_cache as context_cache_module
+from src.components.context_cache import DocumentContextCache
+from src.utils.session_store import session_store
+
+
+class StubCacheAPI:
+    """
+    Stands in for genai.caching.CachedContent: records every create call and
+    returns a resource expiring after the requested ttl.
+    """
+
+    def __init__(self):
+        self.created = []
+
+    def create(self, model, contents, ttl, display_name=None):
+        self.created.append({'model': model, 'contents': contents, 'ttl': ttl, 'display_name': display_name})
+        expire_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=ttl)
+        return type('Cached', (), {'name': f"cachedContents/{len(self.created)}", 'model': model,
+                                   'expire_time': expire_time})()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(context_cache_module, 'GEMINI_API_KEY', 'stub')
+    api = StubCacheAPI()
+    config = {'enabled': True, 'model': 'models/stub-model', 'ttl_seconds': 600, 'min_tokens': 10,
+              'refresh_margin_seconds': 60}
+    return DocumentContextCache(config, cache_api=api), api
+
+
+def _session(text: str) -> str:
+    return session_store.create_session({'text': text})
+
+
+def test_creates_once_and_reuses_handle(cache):
+    cache, api = cache
+    session_id = _session('The document body. ' * 50)
+
+    handle = cache.get(session_id)
+    assert handle.name == 'cachedContents/1'
+    assert handle.model == 'models/stub-model'
+    assert api.created[0]['ttl'] == 600
+    assert api.created[0]['display_name'] == f"session-{session_id}"
+
+    assert cache.get(session_id).name == handle.name
+    assert len(api.created) == 1
+
+
+def test_refreshes_inside_margin_and_after_expiry(cache):
+    cache, api = cache
+    session_id = _session('The document body. ' * 50)
+    cache.get(session_id)
+
+    # Expiring within refresh_margin_seconds counts as expired
+    stored = session_store.get_session(session_id)['context_cache']
+    session_store.update_session(session_id, {'context_cache': {**stored, 'expires_at': time.time() + 30}})
+    assert cache.get(session_id).name == 'cachedContents/2'
+
+    stored = session_store.get_session(session_id)['context_cache']
+    session_store.update_session(session_id, {'context_cache': {**stored, 'expires_at': time.time() - 1}})
+    assert cache.get(session_id).name == 'cachedContents/3'
+    assert len(api.created) == 3
+
+
+def test_short_documents_and_disabled_cache_are_not_cached(cache, monkeypatch):
+    cache, api = cache
+    assert cache.get(_session('Too short.')) is None
+
+    monkeypatch.setattr(context_cache_module, 'GEMINI_API_KEY', '')
+    assert cache.get(_session('The document body. ' * 50)) is None
+    assert api.created == []
@@ -0,0 +1,105 @@
+"""
+Offline tests for provider failover against local OpenAI-compatible stub
+servers; no API key or network access is needed.
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.Agent.openai_agent import OpenAIAgent
+from src.Agent.provider_router import ProviderRouter
+from src.utils.metrics import metrics
+
+
+class StubServer:
+    """
+    /chat/completions endpoint answering `reply`, or HTTP 500 while `failing`.
+    """
+
+    def __init__(self, reply: str):
+        stub = self
+        self.reply = reply
+        self.failing = False
+        self.calls = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('content-length', 0)))
+                stub.calls += 1
+                if stub.failing:
+                    status, body = 500, {'error': {'message': 'stub failure'}}
+                else:
+                    status, body = 200, {
+                        'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': stub.reply},
+                                     'finish_reason': 'stop'}],
+                        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+                    }
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stubs():
+    servers = StubServer('primary'), StubServer('secondary')
+    yield servers
+    for server in servers:
+        server.server.shutdown()
+
+
+def _router(stubs, **kwargs) -> ProviderRouter:
+    # Unique model ids keep each test's metrics windows separate
+    suffix = uuid.uuid4().hex[:8]
+    providers = [OpenAIAgent(api_key='stub', id=f"{name}-{suffix}", base_url=stub.url)
+                 for name, stub in zip(('primary', 'secondary'), stubs)]
+    return ProviderRouter(providers, **kwargs)
+
+
+def test_fails_over_to_next_provider(stubs):
+    primary, _ = stubs
+    router = _router(stubs)
+    primary.failing = True
+    errors = metrics.count('providers:openai:error')
+
+    assert router.generate('hello').text == 'secondary'
+    assert metrics.count('providers:openai:error') == errors + 1
+
+
+def test_single_error_does_not_demote(stubs):
+    primary, _ = stubs
+    router = _router(stubs, min_samples=5)
+    primary.failing = True
+    router.generate('hello')
+
+    assert router.ranked()[0] is router.providers[0]
+
+
+def test_demoted_provider_is_probed_and_recovers(stubs):
+    primary, _ = stubs
+    router = _router(stubs, min_samples=3, probe_every=4)
+    primary.failing = True
+    for _ in range(3):
+        router.generate('hello')
+    assert router.ranked()[0] is router.providers[1]
+
+    primary.failing = False
+    calls = primary.calls
+    for _ in range(40):
+        router.generate('hello')
+    key = router.providers[0].metrics_key
+    assert primary.calls > calls
+    assert metrics.error_rate(key, 3) <= router.max_error_rate